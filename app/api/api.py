@@ -1,10 +1,17 @@
+import asyncio
 import logging
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+import secrets
+from fastapi import FastAPI, HTTPException, Request, Depends, Header
+from fastapi.responses import PlainTextResponse, FileResponse
 from pydantic import BaseModel
 from typing import Dict, Any, Optional, List
 
 from ..core.assistant import SupportAssistant
 from ..core.knowledge_manager import KnowledgeBaseManager
+from ..core.job_queue import JobQueue
+from ..core.question_index import FastPathStats
+from ..core.profiling import SamplingProfiler, RequestProfiler, EventLoopLagMonitor, SlowRequestLog
+from ..logging_config import SAMPLED, set_request_id, request_id_var
 
 logger = logging.getLogger(__name__)
 
@@ -18,9 +25,27 @@ class KnowledgeBaseReload(BaseModel):
     force: bool = False
 
 class SupportAssistantAPI:
-    def __init__(self, assistant: SupportAssistant, kb_manager: KnowledgeBaseManager):
+    def __init__(
+        self,
+        assistant: SupportAssistant,
+        kb_manager: KnowledgeBaseManager,
+        job_queue: JobQueue,
+        watch_kb: bool = True,
+        admin_token: str = "",
+        sampling_profiler: Optional[SamplingProfiler] = None,
+        request_profiler: Optional[RequestProfiler] = None,
+        loop_lag_monitor: Optional[EventLoopLagMonitor] = None,
+        slow_request_log: Optional[SlowRequestLog] = None
+    ):
         self.assistant = assistant
         self.kb_manager = kb_manager
+        self.job_queue = job_queue
+        self.watch_kb = watch_kb
+        self.admin_token = admin_token
+        self.sampling_profiler = sampling_profiler or SamplingProfiler()
+        self.request_profiler = request_profiler
+        self.loop_lag_monitor = loop_lag_monitor or EventLoopLagMonitor()
+        self.slow_request_log = slow_request_log
 
         self.app = FastAPI(
             title="Support Assistant API",
@@ -30,10 +55,33 @@ class SupportAssistantAPI:
             redoc_url="/redoc"
         )
 
+        self._setup_middleware()
+        self._setup_events()
         self._setup_routes()
+        self._setup_admin_routes()
 
         logger.info("FastAPI приложение инициализировано")
 
+    def _setup_middleware(self):
+        @self.app.middleware("http")
+        async def correlation_id(request: Request, call_next):
+            request_id = set_request_id(request.headers.get("X-Request-ID"))
+            response = await call_next(request)
+            response.headers["X-Request-ID"] = request_id
+            return response
+
+    def _setup_events(self):
+        @self.app.on_event("startup")
+        async def startup():
+            if self.watch_kb:
+                self.kb_manager.start_watching()
+            self.loop_lag_monitor.start()
+
+        @self.app.on_event("shutdown")
+        async def shutdown():
+            await self.kb_manager.stop_watching()
+            await self.loop_lag_monitor.stop()
+
     def _setup_routes(self):
         @self.app.get("/")
         async def root():
@@ -44,7 +92,8 @@ class SupportAssistantAPI:
                     "docs": "/docs",
                     "health": "/health",
                     "webhook": "/webhook/chatwoot",
-                    "kb_reload": "/kb/reload"
+                    "kb_reload": "/kb/reload",
+                    "queue_stats": "/queue/stats"
                 }
             }
 
@@ -62,47 +111,46 @@ class SupportAssistantAPI:
                 raise HTTPException(status_code=500, detail=str(e))
 
         @self.app.post("/webhook/chatwoot")
-        async def chatwoot_webhook(webhook: ChatwootWebhook, background_tasks: BackgroundTasks, request: Request):
+        async def chatwoot_webhook(webhook: ChatwootWebhook, request: Request):
             try:
-                logger.info(f"Получен вебхук: {webhook.event}")
+                logger.info("Получен вебхук: %s", webhook.event, extra=SAMPLED)
 
-                webhook_data = await request.json()
-                logger.debug(f"Данные вебхука: {str(webhook_data)[:500]}...")
+                if logger.isEnabledFor(logging.DEBUG):
+                    webhook_data = await request.json()
+                    logger.debug("Данные вебхука: %.500s...", webhook_data)
 
                 if webhook.event == "message_created" and webhook.message:
                     messagetype = webhook.message.get("message_type", "")
 
                     if messagetype == "outgoing":
-                        logger.info("Игнорируем исходящее сообщение от оператора")
+                        logger.debug("Игнорируем исходящее сообщение от оператора")
                         return {"status": "ignored", "reason": "outgoing_message"}
 
                     if webhook.message.get("sender", {}).get("type") == "agent_bot":
-                        logger.info("Игнорируем сообщение от бота")
+                        logger.debug("Игнорируем сообщение от бота")
                         return {"status": "ignored", "reason": "bot_message"}
 
                     conversation_id = webhook.conversation.get("id")
                     message_content = webhook.message.get("content", "")
 
                     if conversation_id and message_content:
-                        logger.info(f"Обработка сообщения в беседе {conversation_id}: '{message_content[:50]}...'")
+                        logger.debug("Сообщение в беседе %s: '%.50s...'", conversation_id, message_content)
 
-
-                        background_tasks.add_task(
-                            self.assistant.process_message,
-                            conversation_id,
-                            message_content
+                        # Запись в SQLite может ждать блокировку воркеров — не блокируем событийный цикл
+                        job_id = await asyncio.to_thread(
+                            self.job_queue.enqueue, conversation_id, message_content, request_id_var.get()
                         )
 
-                        logger.info(f"Задача обработки сообщения добавлена для беседы {conversation_id}")
-                        return {"status": "processing", "conversation_id": conversation_id}
+                        logger.info("Задача %s добавлена в очередь для беседы %s", job_id, conversation_id, extra=SAMPLED)
+                        return {"status": "queued", "conversation_id": conversation_id, "job_id": job_id}
                     else:
                         logger.warning("Недостаточно данных в вебхуке")
                         return {"status": "skipped", "reason": "insufficient_data"}
                 else:
-                    logger.info(f"Игнорируем событие: {webhook.event}")
+                    logger.debug("Игнорируем событие: %s", webhook.event)
                     return {"status": "ignored", "reason": f"event_{webhook.event}"}
             except Exception as e:
-                logger.error(f"Ошибка обработки вебхука: {e}")
+                logger.error("Ошибка обработки вебхука: %s", e)
                 raise HTTPException(status_code=500, detail="Internal server error")
 
         @self.app.post("/kb/reload")
@@ -111,7 +159,8 @@ class SupportAssistantAPI:
                 logger.info("Запуск перезагрузки базы знаний...")
 
 
-                await self.kb_manager.initialize_knowledge_base()
+                force = reload_data.force if reload_data else False
+                await self.kb_manager.initialize_knowledge_base(force=force)
 
 
                 logger.info("База знаний успешно перезагружена")
@@ -135,6 +184,20 @@ class SupportAssistantAPI:
                 logger.error(f"Ошибка получения информации о БЗ: {e}")
                 raise HTTPException(status_code=500, detail=str(e))
 
+        @self.app.get("/queue/stats")
+        async def get_queue_stats():
+            try:
+                await asyncio.to_thread(self.job_queue.add_counters, self.assistant.fast_path_stats.drain())
+                stats = await asyncio.to_thread(self.job_queue.stats)
+                counters = await asyncio.to_thread(self.job_queue.counters)
+                return {
+                    "status": "success",
+                    "data": stats,
+                    "fast_path": FastPathStats.summarize(counters)
+                }
+            except Exception as e:
+                logger.error(f"Ошибка получения статистики очереди: {e}")
+                raise HTTPException(status_code=500, detail=str(e))
 
         @self.app.get("/config")
         async def get_config():
@@ -144,5 +207,70 @@ class SupportAssistantAPI:
                 "status": "active"
             }
 
+    def _require_admin(self, x_admin_token: Optional[str] = Header(default=None)):
+        if not self.admin_token:
+            raise HTTPException(status_code=404, detail="Admin endpoints are disabled")
+        if not x_admin_token or not secrets.compare_digest(x_admin_token, self.admin_token):
+            raise HTTPException(status_code=403, detail="Forbidden")
+
+    def _setup_admin_routes(self):
+        admin = [Depends(self._require_admin)]
+
+        @self.app.get("/admin/profile", dependencies=admin, response_class=PlainTextResponse)
+        async def sample_profile(seconds: float = 10.0, interval_ms: float = 10.0):
+            try:
+                # Сэмплер работает в отдельном потоке, событийный цикл продолжает обслуживать запросы
+                collapsed = await asyncio.to_thread(
+                    self.sampling_profiler.sample, seconds, max(interval_ms, 1.0) / 1000
+                )
+            except RuntimeError as e:
+                raise HTTPException(status_code=409, detail=str(e))
+            return PlainTextResponse(
+                collapsed,
+                headers={"Content-Disposition": "attachment; filename=profile.collapsed"}
+            )
+
+        @self.app.post("/admin/profile/workers", dependencies=admin)
+        async def profile_workers(seconds: float = 10.0, interval_ms: float = 10.0):
+            # Векторизация, Qdrant и Chatwoot выполняются в воркерах: каждый активный воркер
+            # снимет collapsed-стеки и сохранит их в каталог профилей
+            seconds = min(seconds, self.sampling_profiler.max_seconds)
+            request_id = await asyncio.to_thread(
+                self.job_queue.request_profile, seconds, max(interval_ms, 1.0) / 1000
+            )
+            return {
+                "status": "accepted",
+                "profile_request_id": request_id,
+                "workers": [status["worker_id"] for status in await asyncio.to_thread(self.job_queue.worker_statuses)],
+                "files": "/admin/profile/files"
+            }
+
+        @self.app.get("/admin/profile/files", dependencies=admin)
+        async def list_profile_files(limit: int = 100):
+            profiles = self.request_profiler.list_profiles(limit) if self.request_profiler else []
+            return {"status": "success", "data": profiles}
+
+        @self.app.get("/admin/profile/files/{name}", dependencies=admin)
+        async def get_profile_file(name: str):
+            path = self.request_profiler.get_profile_path(name) if self.request_profiler else None
+            if path is None:
+                raise HTTPException(status_code=404, detail="Profile not found")
+            return FileResponse(path, filename=path.name, media_type="application/octet-stream")
+
+        @self.app.get("/admin/loop-lag", dependencies=admin)
+        async def get_loop_lag():
+            return {
+                "status": "success",
+                "data": {
+                    "api": self.loop_lag_monitor.stats(),
+                    "workers": await asyncio.to_thread(self.job_queue.worker_statuses)
+                }
+            }
+
+        @self.app.get("/admin/slow-requests", dependencies=admin)
+        async def get_slow_requests(limit: int = 50):
+            entries = self.slow_request_log.recent(limit) if self.slow_request_log else []
+            return {"status": "success", "data": entries}
+
     def get_app(self):
         return self.app
@@ -2,6 +2,8 @@ import logging
 import httpx
 from typing import Dict, Any, Optional
 
+from ..logging_config import SAMPLED
+
 logger = logging.getLogger(__name__)
 
 class ChatwootClient:
@@ -32,14 +34,14 @@ class ChatwootClient:
                 
             if response.status_code == 200:
                 message_type = "приватное" if private else "публичное"
-                logger.info(f"{message_type} сообщение отправлено в беседу {conversation_id}")
+                logger.info("%s сообщение отправлено в беседу %s", message_type, conversation_id, extra=SAMPLED)
                 return True
             else:
-                logger.error(f"Ошибка отправки сообщения: {response.status_code} - {response.text}")
+                logger.error("Ошибка отправки сообщения: %s - %s", response.status_code, response.text)
                 return False
                 
         except Exception as e:
-            logger.error(f"Ошибка при отправке сообщения: {e}")
+            logger.error("Ошибка при отправке сообщения: %s", e)
             return False
     
     async def get_conversation(self, conversation_id: int) -> Optional[Dict[str, Any]]:
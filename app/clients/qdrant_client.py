@@ -1,17 +1,93 @@
 import logging
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
-from typing import List, Dict, Any, Optional
+from qdrant_client.models import (
+    Distance,
+    VectorParams,
+    PointStruct,
+    HnswConfigDiff,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    QuantizationSearchParams,
+    VectorParamsDiff,
+    CollectionParamsDiff,
+    PointIdsList,
+    Disabled,
+)
+from dataclasses import dataclass, replace
+from typing import List, Dict, Any, Optional, Tuple
 import uuid
 
 # Настраиваем логирование
 logger = logging.getLogger(__name__)
 
+
+@dataclass(frozen=True)
+class CollectionProfile:
+    """Параметры коллекции: HNSW, квантование и размещение на диске."""
+    name: str = "default"
+    hnsw_m: int = 16
+    hnsw_ef_construct: int = 100
+    hnsw_ef: Optional[int] = None
+    quantization: bool = False
+    quantization_quantile: float = 0.99
+    quantization_always_ram: bool = True
+    rescore: bool = True
+    oversampling: float = 2.0
+    on_disk_vectors: bool = False
+    on_disk_payload: bool = False
+
+
+COLLECTION_PROFILES: Dict[str, CollectionProfile] = {
+    "default": CollectionProfile(name="default"),
+    "high_recall": CollectionProfile(
+        name="high_recall",
+        hnsw_m=32,
+        hnsw_ef_construct=256,
+        hnsw_ef=256
+    ),
+    "balanced": CollectionProfile(
+        name="balanced",
+        hnsw_m=16,
+        hnsw_ef_construct=128,
+        hnsw_ef=128,
+        quantization=True
+    ),
+    "low_memory": CollectionProfile(
+        name="low_memory",
+        hnsw_m=16,
+        hnsw_ef_construct=100,
+        hnsw_ef=128,
+        quantization=True,
+        on_disk_vectors=True,
+        on_disk_payload=True
+    ),
+}
+
+
+def get_collection_profile(name: str = "default", overrides: Optional[Dict[str, Any]] = None) -> CollectionProfile:
+    if name not in COLLECTION_PROFILES:
+        raise ValueError(f"Неизвестный профиль коллекции: {name}. Доступные: {list(COLLECTION_PROFILES)}")
+
+    profile = COLLECTION_PROFILES[name]
+    if overrides:
+        profile = replace(profile, **overrides)
+    return profile
+
+
 class QdrantClientWrapper:
-    def __init__(self, host: str = "localhost", port: int = 6333, collection_name: str = "support_kb"):
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 6333,
+        collection_name: str = "support_kb",
+        profile: Optional[CollectionProfile] = None
+    ):
         self.host = host
         self.port = port
         self.collection_name = collection_name
+        self.profile = profile or CollectionProfile()
         self.client = None
         self._connect()
     def _connect(self):
@@ -21,25 +97,133 @@ class QdrantClientWrapper:
         except Exception as e:
             logger.error(f"Ошибка подключения к Qdrant: {e}")
             raise
+    def _hnsw_config(self) -> HnswConfigDiff:
+        return HnswConfigDiff(m=self.profile.hnsw_m, ef_construct=self.profile.hnsw_ef_construct)
+
+    def _quantization_config(self) -> Optional[ScalarQuantization]:
+        if not self.profile.quantization:
+            return None
+        return ScalarQuantization(
+            scalar=ScalarQuantizationConfig(
+                type=ScalarType.INT8,
+                quantile=self.profile.quantization_quantile,
+                always_ram=self.profile.quantization_always_ram
+            )
+        )
+
+    def _search_params(self, exact: bool = False) -> SearchParams:
+        quantization = None
+        if self.profile.quantization:
+            quantization = QuantizationSearchParams(
+                ignore=exact,
+                rescore=self.profile.rescore,
+                oversampling=self.profile.oversampling
+            )
+        return SearchParams(hnsw_ef=self.profile.hnsw_ef, exact=exact, quantization=quantization)
+
     def create_collection(self, vector_size: int = 384):
         try:
             self.client.recreate_collection(
                 collection_name=self.collection_name,
-                vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE)
+                vectors_config=VectorParams(
+                    size=vector_size,
+                    distance=Distance.COSINE,
+                    on_disk=self.profile.on_disk_vectors
+                ),
+                hnsw_config=self._hnsw_config(),
+                quantization_config=self._quantization_config(),
+                on_disk_payload=self.profile.on_disk_payload
+            )
+            logger.info(
+                f"Коллекция '{self.collection_name}' создана с размерностью {vector_size} "
+                f"(профиль: {self.profile.name})"
             )
-            logger.info(f"Коллекция '{self.collection_name}' создана с размерностью {vector_size}")
         except Exception as e:
             logger.error(f"Ошибка создания коллекции: {e}")
             raise
-    def add_points(self, embeddings: List[List[float]], payloads: List[Dict[str, Any]]):
+
+    def apply_profile(self, profile: Optional[CollectionProfile] = None):
+        """Применяет профиль к существующей коллекции без повторной векторизации.
+
+        Qdrant перестраивает индекс и квантованные векторы в фоне из уже
+        сохраненных точек.
+        """
+        if profile is not None:
+            self.profile = profile
+
         try:
+            self.client.update_collection(
+                collection_name=self.collection_name,
+                hnsw_config=self._hnsw_config(),
+                # None оставил бы квантование как есть, поэтому выключаем его явно
+                quantization_config=self._quantization_config() or Disabled.DISABLED,
+                vectors_config={"": VectorParamsDiff(on_disk=self.profile.on_disk_vectors)},
+                collection_params=CollectionParamsDiff(on_disk_payload=self.profile.on_disk_payload)
+            )
+            logger.info(f"Профиль '{self.profile.name}' применен к коллекции '{self.collection_name}'")
+        except Exception as e:
+            logger.error(f"Ошибка применения профиля коллекции: {e}")
+            raise
+
+    def profile_mismatches(self) -> Dict[str, Tuple[Any, Any]]:
+        """Параметры существующей коллекции, отличающиеся от профиля: {параметр: (текущее, ожидаемое)}."""
+        config = self.client.get_collection(collection_name=self.collection_name).config
+
+        vectors = config.params.vectors
+        if isinstance(vectors, dict):
+            vectors = vectors.get("")
+        quantization = getattr(config.quantization_config, "scalar", None)
+
+        current = {
+            "hnsw_m": config.hnsw_config.m,
+            "hnsw_ef_construct": config.hnsw_config.ef_construct,
+            "quantization": quantization is not None,
+            "on_disk_vectors": bool(getattr(vectors, "on_disk", False)),
+            "on_disk_payload": bool(config.params.on_disk_payload),
+        }
+        expected = {
+            "hnsw_m": self.profile.hnsw_m,
+            "hnsw_ef_construct": self.profile.hnsw_ef_construct,
+            "quantization": self.profile.quantization,
+            "on_disk_vectors": self.profile.on_disk_vectors,
+            "on_disk_payload": self.profile.on_disk_payload,
+        }
+        if quantization is not None and self.profile.quantization:
+            current["quantization_quantile"] = quantization.quantile
+            current["quantization_always_ram"] = bool(quantization.always_ram)
+            expected["quantization_quantile"] = self.profile.quantization_quantile
+            expected["quantization_always_ram"] = self.profile.quantization_always_ram
+
+        return {key: (current[key], expected[key]) for key in expected if current[key] != expected[key]}
+
+    def ensure_profile(self) -> bool:
+        """Применяет профиль, если параметры существующей коллекции с ним расходятся.
+
+        Пересоздается коллекция только при полной пересборке БЗ, поэтому без этой
+        проверки смена QDRANT_PROFILE меняла бы лишь параметры поиска.
+        """
+        if not self.collection_exists():
+            return False
+
+        mismatches = self.profile_mismatches()
+        if not mismatches:
+            return False
+
+        details = ", ".join(f"{key}: {current} -> {expected}" for key, (current, expected) in mismatches.items())
+        logger.warning(f"Коллекция '{self.collection_name}' не соответствует профилю '{self.profile.name}' ({details})")
+        self.apply_profile()
+        return True
+    def add_points(self, embeddings: List[List[float]], payloads: List[Dict[str, Any]], ids: Optional[List[str]] = None):
+        try:
+            if ids is None:
+                ids = [str(uuid.uuid4()) for _ in embeddings]
             points = [
                 PointStruct(
-                    id=str(uuid.uuid4()),
+                    id=point_id,
                     vector=embedding,
                     payload=payload
                 )
-                for embedding, payload in zip(embeddings, payloads)
+                for point_id, embedding, payload in zip(ids, embeddings, payloads)
             ]
             operation_info = self.client.upsert(
                 collection_name=self.collection_name,
@@ -51,12 +235,33 @@ class QdrantClientWrapper:
         except Exception as e:
             logger.error(f"Ошибка добавления точек: {e}")
             raise
-    def search(self, query_embedding: List[float], limit: int = 3) -> List[Dict[str, Any]]:
+    def delete_points(self, ids: List[str]):
+        try:
+            operation_info = self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=PointIdsList(points=ids),
+                wait=True
+            )
+            logger.info(f"Удалено {len(ids)} точек из коллекции '{self.collection_name}'")
+            return operation_info
+        except Exception as e:
+            logger.error(f"Ошибка удаления точек: {e}")
+            raise
+
+    def count_points(self) -> int:
+        try:
+            return self.client.count(collection_name=self.collection_name, exact=True).count
+        except Exception as e:
+            logger.error(f"Ошибка подсчета точек: {e}")
+            raise
+
+    def search(self, query_embedding: List[float], limit: int = 3, exact: bool = False) -> List[Dict[str, Any]]:
         try:
             search_results = self.client.search(
                 collection_name=self.collection_name,
                 query_vector=query_embedding,
-                limit=limit
+                limit=limit,
+                search_params=self._search_params(exact)
             )
             results = []
             for result in search_results:
@@ -65,10 +270,10 @@ class QdrantClientWrapper:
                     "payload": result.payload,
                     "id": result.id
                 })
-            logger.info(f"Найдено {len(results)} результатов поиска")
+            logger.debug("Найдено %s результатов поиска", len(results))
             return results
         except Exception as e:
-            logger.error(f"Ошибка поиска: {e}")
+            logger.error("Ошибка поиска: %s", e)
             raise
     def collection_exists(self) -> bool:
         try:
@@ -77,3 +282,11 @@ class QdrantClientWrapper:
         except Exception as e:
             logger.error(f"Ошибка проверки коллекции: {e}")
             return False
+
+    def delete_collection(self):
+        try:
+            self.client.delete_collection(collection_name=self.collection_name)
+            logger.info(f"Коллекция '{self.collection_name}' удалена")
+        except Exception as e:
+            logger.error(f"Ошибка удаления коллекции: {e}")
+            raise
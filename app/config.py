@@ -0,0 +1,95 @@
+from typing import Any, Dict, Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
+
+    qdrant_host: str = "localhost"
+    qdrant_port: int = 6333
+
+    # Профиль коллекции Qdrant (default, high_recall, balanced, low_memory)
+    # и необязательные переопределения его параметров
+    qdrant_profile: str = "default"
+    qdrant_hnsw_m: Optional[int] = None
+    qdrant_hnsw_ef_construct: Optional[int] = None
+    qdrant_hnsw_ef: Optional[int] = None
+    qdrant_quantization: Optional[bool] = None
+    qdrant_rescore: Optional[bool] = None
+    qdrant_oversampling: Optional[float] = None
+    qdrant_on_disk_vectors: Optional[bool] = None
+    qdrant_on_disk_payload: Optional[bool] = None
+
+    chatwoot_base_url: str = "http://localhost:3000"
+    chatwoot_api_token: str = ""
+    chatwoot_account_id: int = 1
+
+    embedder_model: str = "BAAI/bge-small-ru"
+    knowledge_base_path: str = "./data/knowledge_base.csv"
+
+    # Скомпилированный снимок БЗ и автоматическая перезагрузка при изменении источника
+    kb_snapshot_path: Optional[str] = None
+    kb_watch_enabled: bool = True
+    kb_watch_interval_seconds: float = 2.0
+    kb_watch_debounce_seconds: float = 5.0
+
+    # Предобработка запросов: грубый лимит длины до токенизации и приведение к нижнему регистру
+    # (по умолчанию выключено — векторы БЗ построены с исходным регистром)
+    query_max_chars: int = 2000
+    query_lowercase: bool = False
+
+    # Быстрый путь: ответ напрямую из БЗ при совпадении вопроса. Порог относится к почти
+    # точным совпадениям (Жаккар символьных 3-грамм); значение больше 1 отключает быстрый путь
+    kb_fast_path_threshold: float = 0.95
+
+    # Профилирование: эндпоинты /admin/* доступны только с заголовком X-Admin-Token
+    # (при пустом токене отключены). profile_request_sample_rate — доля задач,
+    # которые воркеры профилируют через cProfile
+    admin_token: str = ""
+    profile_dir: str = "./data/profiles"
+    profile_max_seconds: float = 60.0
+    profile_request_sample_rate: float = 0.0
+    slow_request_threshold_ms: float = 2000.0
+    loop_lag_interval_seconds: float = 0.5
+    loop_lag_warn_ms: float = 200.0
+    profile_max_files: int = 200
+    slow_request_log_max_bytes: int = 5 * 1024 * 1024
+    worker_status_interval_seconds: float = 5.0
+
+    api_host: str = "0.0.0.0"
+    api_port: int = 8001
+
+    # Логирование: доля и лимит частоты (записей/с) поточных INFO-записей по сообщениям.
+    # API и воркеры пишут в общий том, поэтому у каждого процесса свой файл ({hostname}, {pid})
+    log_level: str = "INFO"
+    log_json: bool = True
+    log_file: Optional[str] = "/var/log/support-assistant/app-{hostname}-{pid}.log"
+    log_file_max_bytes: int = 10 * 1024 * 1024
+    log_backup_count: int = 10
+    log_sample_rate: float = 0.1
+    log_rate_limit_per_second: float = 20.0
+
+    # Очередь задач вебхука (SQLite в режиме WAL на подключенном томе)
+    queue_db_path: str = "./data/jobs.db"
+    queue_lease_seconds: float = 120.0
+    queue_max_attempts: int = 5
+    queue_retry_delay_seconds: float = 10.0
+    queue_poll_interval_seconds: float = 1.0
+
+    @property
+    def qdrant_profile_overrides(self) -> Dict[str, Any]:
+        overrides = {
+            "hnsw_m": self.qdrant_hnsw_m,
+            "hnsw_ef_construct": self.qdrant_hnsw_ef_construct,
+            "hnsw_ef": self.qdrant_hnsw_ef,
+            "quantization": self.qdrant_quantization,
+            "rescore": self.qdrant_rescore,
+            "oversampling": self.qdrant_oversampling,
+            "on_disk_vectors": self.qdrant_on_disk_vectors,
+            "on_disk_payload": self.qdrant_on_disk_payload,
+        }
+        return {key: value for key, value in overrides.items() if value is not None}
+
+
+settings = Settings()
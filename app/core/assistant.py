@@ -1,6 +1,11 @@
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from .embedder import Embedder
+from .preprocessor import QueryPreprocessor, PreprocessedQuery
+from .question_index import FastPathStats
+from .knowledge_manager import KnowledgeBaseManager
+from .profiling import StageTimer, SlowRequestLog
+from ..logging_config import SAMPLED, request_id_var
 from ..clients.qdrant_client import QdrantClientWrapper
 from ..clients.chatwoot_client import ChatwootClient
 
@@ -13,48 +18,103 @@ class SupportAssistant:
         chatwoot_client: ChatwootClient,
         embedder: Embedder,
         top_k: int = 3,
-        private: bool = True
+        private: bool = True,
+        preprocessor: Optional[QueryPreprocessor] = None,
+        kb_manager: Optional[KnowledgeBaseManager] = None,
+        fast_path_threshold: float = 0.95,
+        slow_request_log: Optional[SlowRequestLog] = None
     ):
         self.qdrant_client = qdrant_client
         self.chatwoot_client = chatwoot_client
         self.embedder = embedder
         self.top_k = top_k
         self.private = private
+        self.preprocessor = preprocessor or QueryPreprocessor(truncate=embedder.truncate_text)
+        self.kb_manager = kb_manager
+        self.fast_path_threshold = fast_path_threshold
+        self.fast_path_stats = FastPathStats()
+        self.slow_request_log = slow_request_log
         
         logger.info(f"AI-ассистент инициализирован (top_k: {top_k}, private: {private})")
 
     async def process_message(self, conversation_id: int, message_text: str) -> bool:
+        timer = StageTimer()
+        route = "search"
         try:
-            logger.info(f"Обработка сообщения в беседе {conversation_id}: '{message_text}'")
-            
-            query_embedding = self.embedder.embed_text(message_text)
-            logger.debug("Эмбеддинг запроса создан")
-            
-            search_results = self.qdrant_client.search(query_embedding, self.top_k)
-            logger.debug(f"Найдено {len(search_results)} релевантных ответов")
-            
-            if not search_results:
-                response = self._format_no_results_response(message_text)
+            logger.info("Обработка сообщения в беседе %s", conversation_id, extra=SAMPLED)
+            logger.debug("Текст сообщения: '%.200s'", message_text)
+
+            with timer.stage("preprocess"):
+                query = self.preprocessor.preprocess(message_text)
+            if query.trivial:
+                route = "trivial"
+                self.fast_path_stats.record("trivial_skipped")
+                logger.debug("Тривиальное сообщение в беседе %s, поиск пропущен", conversation_id)
+                return True
+
+            with timer.stage("fast_path"):
+                search_results = self._match_fast_path(query)
+
+            if search_results is None:
+                with timer.stage("embed"):
+                    query_embedding = self.embedder.embed_text(query.text)
+                logger.debug("Эмбеддинг запроса создан")
+
+                with timer.stage("qdrant"):
+                    search_results = self.qdrant_client.search(query_embedding, self.top_k)
+                logger.debug("Найдено %s релевантных ответов", len(search_results))
             else:
-                response = self._format_response(search_results, message_text)
+                route = "fast_path"
 
-            success = await self.chatwoot_client.send_message(
-                conversation_id=conversation_id,
-                message=response,
-                private=self.private
-            )
+            with timer.stage("format"):
+                if not search_results:
+                    response = self._format_no_results_response(query.text)
+                else:
+                    response = self._format_response(search_results, query.text)
+
+            with timer.stage("chatwoot"):
+                success = await self.chatwoot_client.send_message(
+                    conversation_id=conversation_id,
+                    message=response,
+                    private=self.private
+                )
 
             if success:
-                logger.info(f"Ответ успешно отправлен в беседу {conversation_id}")
+                logger.info("Ответ успешно отправлен в беседу %s", conversation_id, extra=SAMPLED)
             else:
-                logger.error(f"Ошибка отправки ответа в беседу {conversation_id}")
+                logger.error("Ошибка отправки ответа в беседу %s", conversation_id)
 
             return success
 
         except Exception as e:
-            logger.error(f"Ошибка обработки сообщения: {e}")
+            logger.error("Ошибка обработки сообщения: %s", e)
             return False
 
+        finally:
+            if self.slow_request_log is not None:
+                self.slow_request_log.record(
+                    timer,
+                    conversation_id=conversation_id,
+                    route=route,
+                    message_chars=len(message_text or ""),
+                    request_id=request_id_var.get()
+                )
+
+    def _match_fast_path(self, query: PreprocessedQuery) -> Optional[List[Dict[str, Any]]]:
+        if self.kb_manager is None or self.fast_path_threshold > 1.0:
+            return None
+
+        self.fast_path_stats.record("fast_path_lookups")
+        match = self.kb_manager.match_question(query.normalized, self.fast_path_threshold)
+        if match is None:
+            self.fast_path_stats.record("fast_path_misses")
+            return None
+
+        payload, score, kind = match
+        self.fast_path_stats.record(f"fast_path_{kind}_hits")
+        logger.debug("Быстрый путь (%s, %.2f): ответ из БЗ без векторизации", kind, score)
+        return [{"score": score, "payload": payload, "id": payload.get("content_hash"), "match": kind}]
+
     def _format_response(self, search_results: List[Dict[str, Any]], original_question: str) -> str:
         try:
             response_parts = [
@@ -68,12 +128,14 @@ class SupportAssistant:
             for i, result in enumerate(search_results, 1):
                 payload = result["payload"]
                 score = result["score"]
+                # Для быстрого пути score — сходство текста вопросов, а не косинусная релевантность
+                score_label = "Совпадение с вопросом" if result.get("match") else "Релевантность"
 
                 response_parts.extend([
                     f"{i}. {payload.get('question', 'Вопрос')}",
                     f"   Ответ: {payload.get('answer', '')}",
                     f"   Категория: {payload.get('category', 'general')}",
-                    f"   Релевантность: {score:.2f}",
+                    f"   {score_label}: {score:.2f}",
                     ""
                 ])
 
@@ -99,7 +161,7 @@ class SupportAssistant:
             "Ожидайте ответа оператора, который поможет решить вашу проблему."
         )
 
-        logger.info("Ответы не найдены в базе знаний")
+        logger.info("Ответы не найдены в базе знаний", extra=SAMPLED)
         return response
 
     async def health_check(self) -> Dict[str, Any]:
@@ -19,11 +19,24 @@ class Embedder:
         try:
             embedding = self.model.encode(text)
             embedding_list = embedding.tolist()
-            logger.debug(f"Создан эмбеддинг для текста: '{text[:50]}...'")
+            logger.debug("Создан эмбеддинг для текста: '%.50s...'", text)
             return embedding_list
         except Exception as e:
-            logger.error(f"Ошибка создания эмбеддинга: {e}")
+            logger.error("Ошибка создания эмбеддинга: %s", e)
             raise
+    def truncate_text(self, text: str, max_tokens: int = None) -> str:
+        """Обрезает текст до max_seq_length токенов модели (с учетом служебных токенов)."""
+        tokenizer = self.model.tokenizer
+        limit = (max_tokens or self.model.max_seq_length) - 2
+
+        token_ids = tokenizer.encode(text, add_special_tokens=False)
+        if len(token_ids) <= limit:
+            return text
+
+        truncated = tokenizer.decode(token_ids[:limit], skip_special_tokens=True)
+        logger.debug("Текст обрезан с %s до %s токенов", len(token_ids), limit)
+        return truncated
+
     def embed_texts(self, texts: List[str]) -> List[List[float]]:
         try:
             embeddings = self.model.encode(texts)
@@ -0,0 +1,332 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = "pending"
+STATUS_PROCESSING = "processing"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+@dataclass
+class Job:
+    id: int
+    conversation_id: int
+    message: str
+    attempts: int
+    lease_owner: str
+    lease_expires_at: float
+    request_id: Optional[str] = None
+
+
+class JobQueue:
+    """Персистентная очередь сообщений вебхука на SQLite (WAL).
+
+    API только добавляет задачи, воркеры забирают их с арендой (lease)
+    и продлевают ее, пока обрабатывают задачу. Если воркер упал, задача снова
+    становится доступной после истечения аренды — доставка "как минимум
+    один раз"; после max_attempts попыток она переводится в failed.
+    """
+
+    def __init__(self, db_path: str = "./data/jobs.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(self.db_path),
+            timeout=30.0,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._setup()
+
+        logger.info(f"Очередь задач инициализирована: {self.db_path}")
+
+    def _setup(self):
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=30000")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    conversation_id INTEGER NOT NULL,
+                    message TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    available_at REAL NOT NULL,
+                    lease_owner TEXT,
+                    lease_expires_at REAL,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    request_id TEXT
+                )
+                """
+            )
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "request_id" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN request_id TEXT")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_status_available ON jobs (status, available_at)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            # Управление воркерами из API: запросы на профилирование и последние отчеты воркеров
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS profile_requests (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    seconds REAL NOT NULL,
+                    interval REAL NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS worker_status (
+                    worker_id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+
+    def enqueue(self, conversation_id: int, message: str, request_id: Optional[str] = None) -> int:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                INSERT INTO jobs (conversation_id, message, status, available_at, created_at, updated_at, request_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (conversation_id, message, STATUS_PENDING, now, now, now, request_id)
+            )
+            job_id = cursor.lastrowid
+
+        logger.debug("Задача %s добавлена в очередь для беседы %s", job_id, conversation_id)
+        return job_id
+
+    def claim(self, worker_id: str, lease_seconds: float = 120.0, max_attempts: int = 5) -> Optional[Job]:
+        now = time.time()
+        with self._lock:
+            # Сначала проверка без блокировки записи: простаивающие воркеры не должны
+            # раз в секунду занимать БД и мешать API добавлять задачи
+            claimable = self._conn.execute(
+                """
+                SELECT 1 FROM jobs
+                WHERE (status = ? AND available_at <= ?)
+                   OR (status = ? AND lease_expires_at <= ?)
+                LIMIT 1
+                """,
+                (STATUS_PENDING, now, STATUS_PROCESSING, now)
+            ).fetchone()
+            if claimable is None:
+                return None
+
+            # BEGIN IMMEDIATE берет блокировку записи сразу, поэтому два воркера
+            # не могут выбрать одну и ту же задачу.
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Задачи, на которых воркер падал или зависал max_attempts раз, больше не выдаются
+                exhausted = self._conn.execute(
+                    """
+                    UPDATE jobs
+                    SET status = ?, lease_owner = NULL, lease_expires_at = NULL,
+                        last_error = 'lease expired after max attempts', updated_at = ?
+                    WHERE status = ? AND lease_expires_at <= ? AND attempts >= ?
+                    """,
+                    (STATUS_FAILED, now, STATUS_PROCESSING, now, max_attempts)
+                ).rowcount
+                if exhausted:
+                    logger.error("%s задач переведено в failed: аренда истекла после %s попыток", exhausted, max_attempts)
+
+                row = self._conn.execute(
+                    """
+                    SELECT id FROM jobs
+                    WHERE (status = ? AND available_at <= ?)
+                       OR (status = ? AND lease_expires_at <= ?)
+                    ORDER BY id
+                    LIMIT 1
+                    """,
+                    (STATUS_PENDING, now, STATUS_PROCESSING, now)
+                ).fetchone()
+
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+
+                lease_expires_at = now + lease_seconds
+                self._conn.execute(
+                    """
+                    UPDATE jobs
+                    SET status = ?, attempts = attempts + 1, lease_owner = ?,
+                        lease_expires_at = ?, updated_at = ?
+                    WHERE id = ?
+                    """,
+                    (STATUS_PROCESSING, worker_id, lease_expires_at, now, row["id"])
+                )
+                job_row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE id = ?", (row["id"],)
+                ).fetchone()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        return Job(
+            id=job_row["id"],
+            conversation_id=job_row["conversation_id"],
+            message=job_row["message"],
+            attempts=job_row["attempts"],
+            lease_owner=job_row["lease_owner"],
+            lease_expires_at=job_row["lease_expires_at"],
+            request_id=job_row["request_id"]
+        )
+
+    def extend_lease(self, job: Job, lease_seconds: float = 120.0) -> bool:
+        lease_expires_at = time.time() + lease_seconds
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                UPDATE jobs SET lease_expires_at = ?, updated_at = ?
+                WHERE id = ? AND lease_owner = ? AND status = ?
+                """,
+                (lease_expires_at, time.time(), job.id, job.lease_owner, STATUS_PROCESSING)
+            )
+
+        if cursor.rowcount == 0:
+            logger.warning("Аренда задачи %s потеряна, продлить не удалось", job.id)
+            return False
+        job.lease_expires_at = lease_expires_at
+        return True
+
+    def complete(self, job: Job) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                UPDATE jobs
+                SET status = ?, lease_owner = NULL, lease_expires_at = NULL,
+                    last_error = NULL, updated_at = ?
+                WHERE id = ? AND lease_owner = ? AND status = ?
+                """,
+                (STATUS_DONE, time.time(), job.id, job.lease_owner, STATUS_PROCESSING)
+            )
+
+        if cursor.rowcount == 0:
+            logger.warning("Аренда задачи %s потеряна до завершения", job.id)
+            return False
+        return True
+
+    def fail(self, job: Job, error: str, max_attempts: int = 5, retry_delay: float = 10.0) -> bool:
+        now = time.time()
+        final = job.attempts >= max_attempts
+        status = STATUS_FAILED if final else STATUS_PENDING
+        available_at = now if final else now + retry_delay * job.attempts
+
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                UPDATE jobs
+                SET status = ?, available_at = ?, lease_owner = NULL, lease_expires_at = NULL,
+                    last_error = ?, updated_at = ?
+                WHERE id = ? AND lease_owner = ? AND status = ?
+                """,
+                (status, available_at, error, now, job.id, job.lease_owner, STATUS_PROCESSING)
+            )
+
+        if cursor.rowcount == 0:
+            logger.warning("Аренда задачи %s потеряна до записи ошибки", job.id)
+            return False
+
+        if final:
+            logger.error("Задача %s исчерпала попытки (%s): %s", job.id, job.attempts, error)
+        else:
+            logger.warning("Задача %s будет повторена (попытка %s): %s", job.id, job.attempts, error)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) AS count FROM jobs GROUP BY status"
+            ).fetchall()
+
+        stats = {STATUS_PENDING: 0, STATUS_PROCESSING: 0, STATUS_DONE: 0, STATUS_FAILED: 0}
+        for row in rows:
+            stats[row["status"]] = row["count"]
+        return stats
+
+    def add_counters(self, counters: Dict[str, int]):
+        """Накапливает счетчики воркеров, чтобы API видел общую статистику всех процессов."""
+        if not counters:
+            return
+        with self._lock:
+            self._conn.executemany(
+                """
+                INSERT INTO counters (name, value) VALUES (?, ?)
+                ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+                """,
+                list(counters.items())
+            )
+
+    def counters(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT name, value FROM counters").fetchall()
+        return {row["name"]: row["value"] for row in rows}
+
+    def request_profile(self, seconds: float, interval: float) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO profile_requests (seconds, interval, created_at) VALUES (?, ?, ?)",
+                (seconds, interval, time.time())
+            )
+        return cursor.lastrowid
+
+    def profile_requests_after(self, request_id: int, max_age: float = 300.0) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM profile_requests WHERE id > ? AND created_at >= ? ORDER BY id",
+                (request_id, time.time() - max_age)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def last_profile_request_id(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT COALESCE(MAX(id), 0) AS id FROM profile_requests").fetchone()
+        return row["id"]
+
+    def report_worker_status(self, worker_id: str, data: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO worker_status (worker_id, data, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(worker_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+                """,
+                (worker_id, json.dumps(data), time.time())
+            )
+
+    def worker_statuses(self, max_age: float = 60.0) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM worker_status WHERE updated_at >= ? ORDER BY worker_id",
+                (time.time() - max_age,)
+            ).fetchall()
+        return [
+            {"worker_id": row["worker_id"], "updated_at": row["updated_at"], **json.loads(row["data"])}
+            for row in rows
+        ]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,114 @@
+import json
+import logging
+import os
+import struct
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Dict, Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"SAKBSNAP"
+SNAPSHOT_VERSION = 1
+# magic, версия формата, длина JSON-метаданных
+_HEADER = struct.Struct("<8sIQ")
+_ALIGNMENT = 64
+
+
+@dataclass
+class KnowledgeBaseSnapshot:
+    """Скомпилированная база знаний: строки, хэши содержимого и векторы.
+
+    Формат файла: заголовок, JSON с метаданными и строками, затем
+    выровненная матрица float32, которая читается через np.memmap.
+    """
+    rows: List[Dict[str, Any]]
+    vectors: np.ndarray
+    source_path: str
+    source_hash: str
+    model_name: str
+    created_at: float = field(default_factory=time.time)
+    version: int = SNAPSHOT_VERSION
+
+    @property
+    def categories(self) -> Dict[str, int]:
+        return dict(Counter(row["category"] for row in self.rows))
+
+    def vectors_by_hash(self) -> Dict[str, np.ndarray]:
+        return {row["content_hash"]: self.vectors[i] for i, row in enumerate(self.rows)}
+
+
+def _vectors_offset(meta_len: int) -> int:
+    end = _HEADER.size + meta_len
+    return (end + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def write_snapshot(path: Path, snapshot: KnowledgeBaseSnapshot):
+    path = Path(path)
+    vectors = np.ascontiguousarray(snapshot.vectors, dtype=np.float32)
+    meta = json.dumps({
+        "source_path": snapshot.source_path,
+        "source_hash": snapshot.source_hash,
+        "model_name": snapshot.model_name,
+        "created_at": snapshot.created_at,
+        "count": int(vectors.shape[0]),
+        "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+        "categories": snapshot.categories,
+        "rows": snapshot.rows
+    }, ensure_ascii=False).encode("utf-8")
+
+    offset = _vectors_offset(len(meta))
+    tmp_path = path.with_name(path.name + ".tmp")
+
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(meta)))
+        f.write(meta)
+        f.write(b"\0" * (offset - _HEADER.size - len(meta)))
+        f.write(vectors.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+
+    # Атомарная замена: открытые memmap старого файла остаются валидными
+    os.replace(tmp_path, path)
+    logger.info(f"Снимок базы знаний записан: {path} ({vectors.shape[0]} записей)")
+
+
+def read_snapshot(path: Path, mmap: bool = True) -> KnowledgeBaseSnapshot:
+    path = Path(path)
+
+    with open(path, "rb") as f:
+        header = f.read(_HEADER.size)
+        if len(header) != _HEADER.size:
+            raise ValueError(f"Поврежденный снимок базы знаний: {path}")
+
+        magic, version, meta_len = _HEADER.unpack(header)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"Файл не является снимком базы знаний: {path}")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия снимка: {version}")
+
+        meta = json.loads(f.read(meta_len).decode("utf-8"))
+
+    count, dim = meta["count"], meta["dim"]
+    offset = _vectors_offset(meta_len)
+
+    if count == 0 or dim == 0:
+        vectors = np.zeros((count, dim), dtype=np.float32)
+    elif mmap:
+        vectors = np.memmap(path, dtype=np.float32, mode="r", offset=offset, shape=(count, dim))
+    else:
+        vectors = np.fromfile(path, dtype=np.float32, count=count * dim, offset=offset).reshape(count, dim)
+
+    return KnowledgeBaseSnapshot(
+        rows=meta["rows"],
+        vectors=vectors,
+        source_path=meta["source_path"],
+        source_hash=meta["source_hash"],
+        model_name=meta["model_name"],
+        created_at=meta["created_at"],
+        version=version
+    )
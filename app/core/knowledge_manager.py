@@ -1,19 +1,54 @@
 import logging
+import hashlib
+import time
+import uuid
+import numpy as np
 import pandas as pd
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
 import asyncio
 
 from .embedder import Embedder
+from .kb_snapshot import KnowledgeBaseSnapshot, read_snapshot, write_snapshot
+from .question_index import QuestionIndex
 from ..clients.qdrant_client import QdrantClientWrapper
 
 logger = logging.getLogger(__name__)
 
+SUPPORTED_FORMATS = (".csv", ".jsonl", ".parquet")
+
+
+def content_hash(question: str, answer: str, category: str) -> str:
+    return hashlib.sha1(f"{question}\x1f{answer}\x1f{category}".encode("utf-8")).hexdigest()
+
+
+def point_id(hash_value: str) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_OID, hash_value))
+
+
 class KnowledgeBaseManager:
-    def __init__(self, qdrant_client: QdrantClientWrapper, embedder: Embedder, source_path: str = "./data/knowledge_base.csv"):
+    def __init__(
+        self,
+        qdrant_client: QdrantClientWrapper,
+        embedder: Embedder,
+        source_path: str = "./data/knowledge_base.csv",
+        snapshot_path: Optional[str] = None,
+        watch_interval: float = 2.0,
+        watch_debounce: float = 5.0
+    ):
         self.qdrant_client = qdrant_client
         self.embedder = embedder
         self.source_path = Path(source_path)
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else self.source_path.with_suffix(".snapshot")
+        self.watch_interval = watch_interval
+        self.watch_debounce = watch_debounce
+
+        self._snapshot: Optional[KnowledgeBaseSnapshot] = None
+        self._loaded_stat: Optional[Tuple[int, int]] = None
+        self._snapshot_stat: Optional[Tuple[int, int]] = None
+        self.question_index: Optional[QuestionIndex] = None
+        self._reload_lock = asyncio.Lock()
+        self._watch_task: Optional[asyncio.Task] = None
         
         logger.info(f"Менеджер базы знаний инициализирован. Источник: {source_path}")
     
@@ -23,7 +58,15 @@ class KnowledgeBaseManager:
                 logger.error(f"Файл базы знаний не найден: {self.source_path}")
                 raise FileNotFoundError(f"Файл базы знаний не найден: {self.source_path}")
             
-            df = pd.read_csv(self.source_path)
+            suffix = self.source_path.suffix.lower()
+            if suffix == ".csv":
+                df = pd.read_csv(self.source_path)
+            elif suffix == ".jsonl":
+                df = pd.read_json(self.source_path, lines=True)
+            elif suffix == ".parquet":
+                df = pd.read_parquet(self.source_path)
+            else:
+                raise ValueError(f"Неподдерживаемый формат базы знаний: {suffix}. Поддерживаются: {SUPPORTED_FORMATS}")
             
             required_columns = ['question', 'answer']
             missing_columns = [col for col in required_columns if col not in df.columns]
@@ -66,7 +109,8 @@ class KnowledgeBaseManager:
                     "answer": answer,
                     "category": category,
                     "original_text": text,
-                    "index": index
+                    "content_hash": content_hash(question, answer, category),
+                    "index": int(index)
                 }
                 payloads.append(payload)
                 
@@ -77,42 +121,229 @@ class KnowledgeBaseManager:
         logger.info(f"Подготовлено {len(texts)} текстов для векторизации")
         return texts, payloads
     
-    async def initialize_knowledge_base(self):
+    @staticmethod
+    def _file_stat(path: Path) -> Optional[Tuple[int, int]]:
         try:
-            logger.info("Начало инициализации базы знаний...")
+            stat = path.stat()
+            return stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError:
+            return None
             
-            df = self.load_knowledge_base()
-            texts, payloads = self.prepare_data(df)
+    def _source_stat(self) -> Optional[Tuple[int, int]]:
+        return self._file_stat(self.source_path)
             
-            if not texts:
-                logger.error("Нет данных для загрузки в базу знаний")
-                return
+    def _set_snapshot(self, snapshot: KnowledgeBaseSnapshot, stat: Optional[Tuple[int, int]]):
+        self.question_index = QuestionIndex(snapshot.rows)
+        self._snapshot = snapshot
+        self._snapshot_stat = stat
             
-            logger.info("Создание эмбеддингов...")
-            embeddings = self.embedder.embed_texts(texts)
+    def load_snapshot(self) -> bool:
+        """Загружает готовый снимок без синхронизации с Qdrant (для воркеров)."""
+        # Метку снимка фиксируем до чтения: замена файла во время чтения не будет пропущена
+        stat = self._file_stat(self.snapshot_path)
+        snapshot = self._read_snapshot()
+        if snapshot is None:
+            return False
+        self._set_snapshot(snapshot, stat)
+        logger.info(f"Снимок базы знаний загружен: {len(snapshot.rows)} записей")
+        return True
             
-            vector_size = len(embeddings[0]) if embeddings else 384
+    def refresh_snapshot(self) -> bool:
+        stat = self._file_stat(self.snapshot_path)
+        if stat is None or stat == self._snapshot_stat:
+            return False
+        return self.load_snapshot()
+
+    def match_question(self, normalized: str, threshold: float = 0.95) -> Optional[Tuple[Dict[str, Any], float, str]]:
+        index = self.question_index
+        if index is None:
+            return None
+        return index.match(normalized, threshold)
+
+    def _source_hash(self) -> str:
+        digest = hashlib.sha256()
+        with open(self.source_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _read_snapshot(self) -> Optional[KnowledgeBaseSnapshot]:
+        if not self.snapshot_path.exists():
+            return None
+        try:
+            return read_snapshot(self.snapshot_path)
+        except Exception as e:
+            logger.warning(f"Снимок базы знаний не прочитан, будет пересобран: {e}")
+            return None
+
+    def _compile_snapshot(self, source_hash: str, previous: Optional[KnowledgeBaseSnapshot]) -> KnowledgeBaseSnapshot:
+        df = self.load_knowledge_base()
+        texts, payloads = self.prepare_data(df)
+
+        reusable = previous.vectors_by_hash() if previous is not None else {}
+        missing = [i for i, payload in enumerate(payloads) if payload["content_hash"] not in reusable]
+
+        if missing:
+            logger.info(f"Создание эмбеддингов для {len(missing)} из {len(texts)} записей...")
+            new_embeddings = self.embedder.embed_texts([texts[i] for i in missing])
+            computed = dict(zip(missing, new_embeddings))
+        else:
+            computed = {}
+
+        vectors = np.asarray(
+            [computed[i] if i in computed else reusable[payload["content_hash"]] for i, payload in enumerate(payloads)],
+            dtype=np.float32
+        )
+
+        snapshot = KnowledgeBaseSnapshot(
+            rows=payloads,
+            vectors=vectors,
+            source_path=str(self.source_path),
+            source_hash=source_hash,
+            model_name=self.embedder.model_name
+        )
+        return snapshot
+
+    def _sync_qdrant(self, snapshot: KnowledgeBaseSnapshot, previous: Optional[KnowledgeBaseSnapshot]):
+        ids = [point_id(row["content_hash"]) for row in snapshot.rows]
+
+        full_rebuild = (
+            previous is None
+            or not self.qdrant_client.collection_exists()
+            or self.qdrant_client.count_points() != len(set(point_id(row["content_hash"]) for row in previous.rows))
+        )
+
+        if full_rebuild:
+            vector_size = snapshot.vectors.shape[1]
             logger.info(f"Создание коллекции с размерностью {vector_size}...")
             self.qdrant_client.create_collection(vector_size)
-            
             logger.info("Загрузка данных в Qdrant...")
-            self.qdrant_client.add_points(embeddings, payloads)
+            self.qdrant_client.add_points(snapshot.vectors.tolist(), snapshot.rows, ids)
+            return
             
-            logger.info("База знаний успешно инициализирована в Qdrant!")
+        previous_index = {point_id(row["content_hash"]): row["index"] for row in previous.rows}
+        changed = [i for i, pid in enumerate(ids) if previous_index.get(pid) != snapshot.rows[i]["index"]]
+        removed = list(set(previous_index) - set(ids))
             
-        except Exception as e:
-            logger.error(f"Ошибка инициализации базы знаний: {e}")
-            raise
+        if changed:
+            self.qdrant_client.add_points(
+                [snapshot.vectors[i].tolist() for i in changed],
+                [snapshot.rows[i] for i in changed],
+                [ids[i] for i in changed]
+            )
+        if removed:
+            self.qdrant_client.delete_points(removed)
+            
+        logger.info(f"Qdrant синхронизирован инкрементально: обновлено {len(changed)}, удалено {len(removed)}")
+
+    def _reload(self, force: bool = False):
+        if not self.source_path.exists():
+            logger.error(f"Файл базы знаний не найден: {self.source_path}")
+            raise FileNotFoundError(f"Файл базы знаний не найден: {self.source_path}")
+
+        # Метку файла фиксируем до чтения: изменение во время сборки вызовет еще одну перезагрузку
+        source_stat = self._source_stat()
+        source_hash = self._source_hash()
+
+        previous = self._snapshot or self._read_snapshot()
+        if previous is not None and previous.model_name != self.embedder.model_name:
+            logger.info("Модель эмбеддингов изменилась, снимок будет пересобран")
+            previous = None
+        if force:
+            previous = None
+
+        if previous is not None and previous.source_hash == source_hash:
+            logger.info(f"Источник не изменился, используется снимок {self.snapshot_path}")
+            snapshot = previous
+        else:
+            snapshot = self._compile_snapshot(source_hash, previous)
+
+        if not snapshot.rows:
+            logger.error("Нет данных для загрузки в базу знаний")
+            return
+
+        self._sync_qdrant(snapshot, previous)
+
+        # Снимок записывается только после успешной синхронизации: иначе после рестарта
+        # совпавший source_hash скрыл бы несинхронизированные изменения в Qdrant
+        if snapshot is not previous:
+            write_snapshot(self.snapshot_path, snapshot)
+
+        self._set_snapshot(snapshot, self._file_stat(self.snapshot_path))
+        self._loaded_stat = source_stat
+
+        logger.info("База знаний успешно инициализирована в Qdrant!")
+
+    async def initialize_knowledge_base(self, force: bool = False):
+        async with self._reload_lock:
+            try:
+                logger.info("Начало инициализации базы знаний...")
+                # Хеширование, разбор источника, векторизация, запись снимка и синхронизация
+                # с Qdrant блокируют поток, поэтому вся перезагрузка выполняется вне событийного цикла
+                await asyncio.to_thread(self._reload, force)
+
+            except Exception as e:
+                logger.error(f"Ошибка инициализации базы знаний: {e}")
+                raise
+
+    def start_watching(self):
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self._watch_loop())
+            logger.info(f"Отслеживание изменений {self.source_path} запущено")
+
+    async def stop_watching(self):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+            logger.info("Отслеживание изменений базы знаний остановлено")
+
+    async def _watch_loop(self):
+        observed = self._loaded_stat
+        changed_at = None
+
+        while True:
+            await asyncio.sleep(self.watch_interval)
+
+            stat = self._source_stat()
+            if stat is None or stat == self._loaded_stat:
+                observed, changed_at = stat, None
+                continue
+
+            if stat != observed:
+                # Файл еще меняется — ждем, пока он не будет стабилен watch_debounce секунд
+                observed, changed_at = stat, time.monotonic()
+                continue
+
+            if time.monotonic() - changed_at < self.watch_debounce:
+                continue
+
+            logger.info(f"Обнаружено изменение {self.source_path}, перезагрузка базы знаний...")
+            try:
+                await self.initialize_knowledge_base()
+            except Exception as e:
+                logger.error(f"Ошибка автоматической перезагрузки базы знаний: {e}")
+                changed_at = time.monotonic()
     
     def get_knowledge_base_info(self) -> Dict[str, Any]:
         try:
-            df = self.load_knowledge_base()
+            snapshot = self._snapshot or self._read_snapshot()
+            if snapshot is None:
+                return {"error": "База знаний еще не загружена"}
             
             info = {
-                "total_entries": len(df),
-                "categories": df['category'].value_counts().to_dict() if 'category' in df.columns else {},
+                "total_entries": len(snapshot.rows),
+                "categories": snapshot.categories,
                 "source_file": str(self.source_path),
-                "file_exists": self.source_path.exists()
+                "file_exists": self.source_path.exists(),
+                "snapshot_file": str(self.snapshot_path),
+                "snapshot_version": snapshot.version,
+                "snapshot_created_at": snapshot.created_at,
+                "source_hash": snapshot.source_hash,
+                "watching": self._watch_task is not None and not self._watch_task.done()
             }
             
             return info
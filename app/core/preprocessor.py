@@ -0,0 +1,179 @@
+import html
+import logging
+import re
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+_BLOCK_TAGS = re.compile(r"<\s*(br|/p|/div|/li|/tr|/h\d)\b[^>]*>", re.IGNORECASE)
+_SCRIPT_STYLE = re.compile(r"<\s*(script|style)\b.*?<\s*/\s*\1\s*>", re.IGNORECASE | re.DOTALL)
+_BLOCKQUOTE = re.compile(r"<\s*blockquote\b.*?<\s*/\s*blockquote\s*>", re.IGNORECASE | re.DOTALL)
+_TAGS = re.compile(r"<[^>]+>")
+_MARKDOWN = re.compile(r"(\*\*|__|~~|`+)")
+
+# Возможное начало цитируемой переписки; отбрасывается, только если
+# за строкой действительно идет цитата (строки с ">") или блок заголовков письма
+_QUOTE_HEADERS = re.compile(
+    r"^\s*("
+    r"-{2,}\s*(original message|исходное сообщение|пересылаемое сообщение|forwarded message)\s*-{2,}"
+    r"|on .{0,200} wrote:"
+    r"|.{0,200}(написал|написала|написал\(а\)|пишет):"
+    r"|from:\s.+"
+    r"|от:\s.+"
+    r")\s*$",
+    re.IGNORECASE
+)
+
+# Начало подписи; отбрасывается, только если после нее идет несколько коротких строк в конце сообщения
+_SIGNATURE = re.compile(
+    r"^\s*("
+    r"--\s?"
+    r"|отправлено (с|из) .+"
+    r"|sent from my .+"
+    r"|с уважением,?.*"
+    r"|best regards,?.*"
+    r")\s*$",
+    re.IGNORECASE
+)
+_SIGNATURE_MAX_LINES = 6
+_SIGNATURE_MAX_LINE_CHARS = 80
+
+_EMAIL_HEADER = re.compile(
+    r"^\s*(from|to|cc|sent|date|subject|от|кому|копия|отправлено|дата|тема):\s*\S",
+    re.IGNORECASE
+)
+
+_TRIVIAL_PHRASES = {
+    "привет", "здравствуйте", "здравствуй", "добрый день", "добрый вечер", "доброе утро",
+    "спасибо", "спасибо большое", "большое спасибо", "благодарю", "ок", "окей", "ok", "okay",
+    "хорошо", "понятно", "ясно", "ага", "угу", "пока", "до свидания",
+    "hi", "hello", "hey", "thanks", "thank you", "thx", "bye",
+}
+
+_NON_WORD = re.compile(r"[^\w]+", re.UNICODE)
+
+
+@dataclass
+class PreprocessedQuery:
+    original: str
+    cleaned: str
+    text: str
+    normalized: str
+    trivial: bool
+    truncated: bool
+
+
+class QueryPreprocessor:
+    """Очистка входящего сообщения перед векторизацией.
+
+    Убирает разметку, цитаты и подписи, нормализует пробелы и ограничивает
+    длину запроса числом токенов модели, чтобы время encode было предсказуемым.
+    """
+
+    def __init__(
+        self,
+        truncate: Optional[Callable[[str], str]] = None,
+        max_chars: int = 2000,
+        lowercase: bool = False
+    ):
+        self.truncate = truncate
+        self.max_chars = max_chars
+        self.lowercase = lowercase
+
+    def strip_markup(self, text: str) -> str:
+        if "<" in text and ">" in text:
+            text = _SCRIPT_STYLE.sub(" ", text)
+            text = _BLOCKQUOTE.sub("\n", text)
+            text = _BLOCK_TAGS.sub("\n", text)
+            text = _TAGS.sub(" ", text)
+        text = html.unescape(text)
+        return _MARKDOWN.sub("", text)
+
+    @staticmethod
+    def _starts_quote(lines, i: int) -> bool:
+        following = [line for line in lines[i + 1:i + 6] if line.strip()]
+        if following and following[0].lstrip().startswith(">"):
+            return True
+        block = [lines[i]] + following[:4]
+        return sum(1 for line in block if _EMAIL_HEADER.match(line)) >= 2
+
+    def strip_quotes(self, text: str) -> str:
+        source = text.splitlines()
+        lines = []
+        for i, line in enumerate(source):
+            if line.lstrip().startswith(">"):
+                continue
+            if lines and _QUOTE_HEADERS.match(line) and self._starts_quote(source, i):
+                break
+            lines.append(line)
+        return "\n".join(lines)
+
+    @staticmethod
+    def strip_signature(text: str) -> str:
+        lines = text.splitlines()
+        for i, line in enumerate(lines):
+            if line.lstrip().startswith(">") or not _SIGNATURE.match(line):
+                continue
+            if not any(previous.strip() for previous in lines[:i]):
+                continue
+            # Цитаты после подписи не считаются: их уберет strip_quotes
+            tail = [rest for rest in lines[i + 1:] if rest.strip() and not rest.lstrip().startswith(">")]
+            if len(tail) <= _SIGNATURE_MAX_LINES and all(len(rest.strip()) <= _SIGNATURE_MAX_LINE_CHARS for rest in tail):
+                return "\n".join(lines[:i])
+        return text
+
+    @staticmethod
+    def normalize_whitespace(text: str) -> str:
+        return " ".join(text.split())
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Ключ сравнения: нижний регистр, только буквы и цифры."""
+        return " ".join(_NON_WORD.sub(" ", text.lower().replace("ё", "е")).split())
+
+    def is_trivial(self, normalized: str) -> bool:
+        if not normalized or not any(ch.isalnum() for ch in normalized):
+            return True
+        return normalized in _TRIVIAL_PHRASES
+
+    def preprocess(self, text: Optional[str]) -> PreprocessedQuery:
+        original = text or ""
+
+        # Грубая обрезка до разбора: огромные вставки не должны попадать в regex и токенизатор целиком
+        raw = original[: self.max_chars * 4]
+        unquoted = self.strip_markup(raw)
+        unsigned = self.strip_signature(unquoted)
+        # Подпись проверяется еще раз после цитат: в ответах Outlook она стоит перед заголовками письма
+        cleaned = self.normalize_whitespace(self.strip_signature(self.strip_quotes(unquoted)))
+        if not cleaned:
+            # Сообщение целиком из цитаты: лучше искать по ней, чем не ответить
+            cleaned = self.normalize_whitespace(unsigned)
+        normalized = self.normalize(cleaned)
+        # Тривиальность проверяется до удаления цитат, чтобы вопрос после
+        # приветствия не потерялся из-за ошибочно распознанной цитаты
+        trivial = self.is_trivial(self.normalize(unsigned))
+
+        truncated = len(raw) < len(original) or len(cleaned) > self.max_chars
+        query = cleaned[: self.max_chars]
+        if self.truncate is not None and query:
+            limited = self.truncate(query)
+            truncated = truncated or limited != query
+            query = limited
+        if self.lowercase:
+            query = query.lower()
+
+        result = PreprocessedQuery(
+            original=original,
+            cleaned=cleaned,
+            text=query,
+            normalized=normalized,
+            trivial=trivial,
+            truncated=truncated
+        )
+
+        logger.debug(
+            "Предобработка запроса: %s -> %s символов (trivial=%s, truncated=%s)",
+            len(original), len(query), result.trivial, truncated
+        )
+        return result
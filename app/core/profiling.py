@@ -0,0 +1,284 @@
+import asyncio
+import cProfile
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SUFFIXES = (".prof", ".collapsed")
+
+
+def _profile_files(directory: Path) -> List[Path]:
+    """Файлы профилей от новых к старым; файлы, удаленные другим процессом, пропускаются."""
+    files = []
+    for path in directory.glob("*"):
+        if path.suffix not in PROFILE_SUFFIXES:
+            continue
+        try:
+            files.append((path.stat().st_mtime, path))
+        except OSError:
+            continue
+    return [path for _, path in sorted(files, reverse=True)]
+
+
+def prune_files(directory: Path, max_files: int):
+    """Удаляет самые старые файлы профилей сверх max_files."""
+    files = _profile_files(directory)
+    if len(files) <= max_files:
+        return
+    for path in files[max_files:]:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+class StageTimer:
+    """Замер длительности этапов обработки одного сообщения, в миллисекундах."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + (time.perf_counter() - started) * 1000
+
+    @property
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+
+class SlowRequestLog:
+    """Журнал медленных сообщений в JSONL на общем томе.
+
+    Пишут API и воркеры, читает админский эндпоинт API. При превышении
+    max_bytes файл переименовывается в .1, предыдущая копия удаляется.
+    """
+
+    def __init__(self, path: str, threshold_ms: float = 2000.0, max_bytes: int = 5 * 1024 * 1024):
+        self.path = Path(path)
+        self.threshold_ms = threshold_ms
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def record(self, timer: StageTimer, **context) -> bool:
+        total_ms = timer.total_ms
+        if total_ms < self.threshold_ms:
+            return False
+
+        entry = {
+            "ts": time.time(),
+            "total_ms": round(total_ms, 2),
+            "stages": {name: round(ms, 2) for name, ms in timer.stages.items()},
+            **context
+        }
+        logger.warning("Медленная обработка сообщения: %.0f мс", total_ms, extra={"slow_request": entry})
+
+        try:
+            with self._lock:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                if self.path.exists() and self.path.stat().st_size >= self.max_bytes:
+                    os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.error("Ошибка записи журнала медленных запросов: %s", e)
+        return True
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        if not self.path.exists():
+            return []
+        with open(self.path, "r", encoding="utf-8", errors="replace") as f:
+            lines = deque(f, maxlen=limit)
+
+        entries = []
+        for line in reversed(lines):
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # Строка могла быть оборвана параллельной записью другого процесса
+                continue
+        return entries
+
+
+class SamplingProfiler:
+    """Сэмплирующий профилировщик всего процесса без внешних зависимостей.
+
+    Фоновый поток периодически снимает стеки всех потоков через
+    sys._current_frames() и возвращает их в формате collapsed stacks
+    (flamegraph.pl, speedscope, inferno).
+    """
+
+    def __init__(self, max_seconds: float = 60.0):
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _frame_label(frame) -> str:
+        code = frame.f_code
+        module = Path(code.co_filename).stem
+        return f"{module}:{code.co_name}:{frame.f_lineno}"
+
+    def sample(self, seconds: float, interval: float = 0.01) -> str:
+        seconds = min(seconds, self.max_seconds)
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("Профилирование уже выполняется")
+
+        try:
+            own_thread = threading.get_ident()
+            stacks = Counter()
+            deadline = time.monotonic() + seconds
+
+            while time.monotonic() < deadline:
+                # Имена обновляются на каждой итерации: потоки to_thread создаются по ходу работы
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    labels = []
+                    while frame is not None:
+                        labels.append(self._frame_label(frame))
+                        frame = frame.f_back
+                    labels.append(names.get(thread_id, str(thread_id)))
+                    stacks[";".join(reversed(labels))] += 1
+                time.sleep(interval)
+
+            return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+        finally:
+            self._lock.release()
+
+
+class RequestProfiler:
+    """cProfile для случайной доли запросов; результаты сохраняются в .prof файлы.
+
+    Профиль охватывает весь поток событийного цикла на время запроса,
+    поэтому в него попадают и параллельно выполняющиеся задачи. В том же
+    каталоге хранятся collapsed-стеки сэмплирующего профилировщика воркеров;
+    хранится не более max_files файлов.
+    """
+
+    def __init__(self, output_dir: str, sample_rate: float = 0.0, max_files: int = 200):
+        self.output_dir = Path(output_dir)
+        self.sample_rate = sample_rate
+        self.max_files = max_files
+        self._active = False
+
+    @contextmanager
+    def profile(self, name: str):
+        if self.sample_rate <= 0 or self._active or random.random() >= self.sample_rate:
+            yield
+            return
+
+        self._active = True
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            self._active = False
+            try:
+                self.output_dir.mkdir(parents=True, exist_ok=True)
+                path = self.output_dir / f"{int(time.time() * 1000)}-{name}.prof"
+                profiler.dump_stats(str(path))
+                prune_files(self.output_dir, self.max_files)
+                logger.debug("Профиль запроса сохранен: %s", path)
+            except OSError as e:
+                logger.error("Ошибка сохранения профиля запроса: %s", e)
+
+    def save_collapsed(self, name: str, collapsed: str) -> Path:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        path = self.output_dir / f"{int(time.time() * 1000)}-{name}.collapsed"
+        path.write_text(collapsed, encoding="utf-8")
+        prune_files(self.output_dir, self.max_files)
+        return path
+
+    def list_profiles(self, limit: int = 100) -> List[Dict[str, Any]]:
+        if not self.output_dir.exists():
+            return []
+        profiles = []
+        for path in _profile_files(self.output_dir)[:limit]:
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            profiles.append({"name": path.name, "size": stat.st_size, "mtime": stat.st_mtime})
+        return profiles
+
+    def get_profile_path(self, name: str) -> Optional[Path]:
+        path = self.output_dir / Path(name).name
+        if path.suffix not in PROFILE_SUFFIXES or not path.exists():
+            return None
+        return path
+
+
+class EventLoopLagMonitor:
+    """Измеряет задержку событийного цикла: насколько позже запланированного просыпается sleep.
+
+    При warn_ms=None предупреждения не пишутся (в воркере цикл ожидаемо
+    блокируется векторизацией), статистика доступна через stats().
+    """
+
+    def __init__(self, interval: float = 0.5, warn_ms: Optional[float] = 200.0, window: int = 600):
+        self.interval = interval
+        self.warn_ms = warn_ms
+        self._samples = deque(maxlen=window)
+        self._max_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (loop.time() - expected) * 1000)
+
+            self._samples.append(lag_ms)
+            self._max_ms = max(self._max_ms, lag_ms)
+            if self.warn_ms is not None and lag_ms >= self.warn_ms:
+                logger.warning("Задержка событийного цикла: %.0f мс", lag_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        samples = sorted(self._samples)
+        if not samples:
+            return {"samples": 0, "running": self._task is not None and not self._task.done()}
+
+        def percentile(p: float) -> float:
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))], 2)
+
+        return {
+            "samples": len(samples),
+            "running": self._task is not None and not self._task.done(),
+            "last_ms": round(self._samples[-1], 2),
+            "p50_ms": percentile(0.5),
+            "p99_ms": percentile(0.99),
+            "max_window_ms": round(samples[-1], 2),
+            "max_ms": round(self._max_ms, 2)
+        }
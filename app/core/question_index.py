@@ -0,0 +1,152 @@
+import logging
+import math
+from collections import Counter, defaultdict
+from typing import List, Dict, Any, Optional, Tuple
+
+from .preprocessor import QueryPreprocessor
+
+logger = logging.getLogger(__name__)
+
+MATCH_EXACT = "exact"
+MATCH_NEAR = "near"
+
+# Слова и приставки, меняющие смысл вопроса на противоположный
+_NEGATIONS = {"не", "ни", "нет", "без", "not", "no", "without"}
+_NEGATION_PREFIXES = ("не", "без", "бес", "un", "non")
+
+# Сколько n-грамм запроса сверх минимально необходимых проверяется по инвертированному индексу:
+# больше — меньше кандидатов на точный подсчет, но длиннее обходимые списки
+_PROBE_EXTRA = 3
+
+
+def char_ngrams(text: str, n: int = 3) -> frozenset:
+    padded = f" {text} "
+    if len(padded) <= n:
+        return frozenset([padded])
+    return frozenset(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+
+def changes_negation(left: str, right: str) -> bool:
+    """Проверяет, отличаются ли вопросы отрицанием ("надежные" / "ненадежные", "с" / "без")."""
+    left_tokens, right_tokens = set(left.split()), set(right.split())
+    added, removed = left_tokens - right_tokens, right_tokens - left_tokens
+
+    if (added | removed) & _NEGATIONS:
+        return True
+
+    for a in added:
+        for b in removed:
+            longer, shorter = (a, b) if len(a) > len(b) else (b, a)
+            for prefix in _NEGATION_PREFIXES:
+                if longer.startswith(prefix) and longer[len(prefix):] == shorter:
+                    return True
+    return False
+
+
+class QuestionIndex:
+    """Поиск дубликатов вопросов БЗ без модели.
+
+    Точное совпадение — по нормализованному вопросу, почти точное —
+    по коэффициенту Жаккара символьных n-грамм через инвертированный индекс.
+    Кандидаты берутся только из списков самых редких n-грамм запроса
+    (prefix filtering), поэтому частые n-граммы не обходят всю БЗ.
+    Почти точное совпадение отклоняется, если вопросы различаются отрицанием.
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]], ngram_size: int = 3):
+        self.rows = rows
+        self.ngram_size = ngram_size
+        self._exact: Dict[str, int] = {}
+        self._keys: List[str] = []
+        self._sizes: List[int] = []
+        postings = defaultdict(list)
+
+        for i, row in enumerate(rows):
+            key = QueryPreprocessor.normalize(row.get("question", ""))
+            self._exact.setdefault(key, i)
+            self._keys.append(key)
+
+            grams = char_ngrams(key, ngram_size) if key else frozenset()
+            self._sizes.append(len(grams))
+            for gram in grams:
+                postings[gram].append(i)
+
+        self._postings: Dict[str, List[int]] = dict(postings)
+        logger.info(f"Индекс вопросов построен: {len(self._exact)} уникальных вопросов, {len(self._postings)} n-грамм")
+
+    def match(self, normalized: str, threshold: float = 0.95) -> Optional[Tuple[Dict[str, Any], float, str]]:
+        if not normalized:
+            return None
+
+        exact = self._exact.get(normalized)
+        if exact is not None:
+            return self.rows[exact], 1.0, MATCH_EXACT
+
+        grams = char_ngrams(normalized, self.ngram_size)
+        size = len(grams)
+
+        # Жаккар >= threshold требует не меньше ceil(threshold * size) общих n-грамм: подходящий
+        # вопрос может не содержать не больше size - min_overlap n-грамм запроса. Поэтому кандидаты
+        # берутся из списков самых редких n-грамм, и среди них у кандидата должно быть достаточно общих
+        min_overlap = math.ceil(threshold * size - 1e-9)
+        max_missing = size - min_overlap
+        if max_missing < 0:
+            return None
+        probe = sorted(grams, key=lambda gram: len(self._postings.get(gram, ())))[:max_missing + 1 + _PROBE_EXTRA]
+        min_hits = len(probe) - max_missing
+
+        # Жаккар >= threshold невозможен, если размеры множеств слишком различаются
+        min_size, max_size = size * threshold, size / threshold
+
+        hits = Counter()
+        for gram in probe:
+            postings = self._postings.get(gram)
+            if postings:
+                hits.update(postings)
+
+        best_index, best_score = None, 0.0
+        for i, count in hits.items():
+            if count < min_hits:
+                continue
+            other = self._sizes[i]
+            if other < min_size or other > max_size:
+                continue
+            overlap = len(grams & char_ngrams(self._keys[i], self.ngram_size))
+            score = overlap / (size + other - overlap)
+            if score > best_score:
+                best_index, best_score = i, score
+
+        if best_index is None or best_score < threshold:
+            return None
+        if changes_negation(normalized, self._keys[best_index]):
+            logger.debug("Почти точное совпадение отклонено: вопросы различаются отрицанием")
+            return None
+        return self.rows[best_index], best_score, MATCH_NEAR
+
+
+class FastPathStats:
+    """Счетчики быстрого пути: сколько сообщений обошлось без векторизации."""
+
+    NAMES = ("fast_path_lookups", "fast_path_exact_hits", "fast_path_near_hits", "fast_path_misses", "trivial_skipped")
+
+    def __init__(self):
+        self._counters = Counter()
+
+    def record(self, name: str):
+        self._counters[name] += 1
+
+    def drain(self) -> Dict[str, int]:
+        counters = dict(self._counters)
+        self._counters.clear()
+        return counters
+
+    @staticmethod
+    def summarize(counters: Dict[str, int]) -> Dict[str, Any]:
+        summary = {name: counters.get(name, 0) for name in FastPathStats.NAMES}
+        lookups = summary["fast_path_lookups"]
+        hits = summary["fast_path_exact_hits"] + summary["fast_path_near_hits"]
+        handled = lookups + summary["trivial_skipped"]
+
+        summary["fast_path_hit_rate"] = hits / lookups if lookups else 0.0
+        summary["embedding_bypass_rate"] = (hits + summary["trivial_skipped"]) / handled if handled else 0.0
+        return summary
@@ -0,0 +1,225 @@
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import socket
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from loguru import logger as loguru_logger
+
+# Идентификатор запроса, общий для всех записей одного вебхука или задачи очереди
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Помечает поточные INFO-записи (по одной на сообщение), к которым применяется сэмплирование
+SAMPLED = {"sampled": True}
+
+# color_message добавляет uvicorn для цветного вывода в консоль
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {
+    "message", "asctime", "request_id", "sampled", "color_message"
+}
+
+# Логгеры uvicorn по умолчанию пишут в stderr синхронно из событийного цикла
+_UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def set_request_id(request_id: Optional[str] = None) -> str:
+    request_id = request_id or new_request_id()
+    request_id_var.set(request_id)
+    return request_id
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+def _record_extra(record: logging.LogRecord) -> dict:
+    # loguru передает значения bind() в stdlib-запись одним словарем "extra"
+    extra = getattr(record, "extra", None)
+    return extra if isinstance(extra, dict) else {}
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает долю помеченных SAMPLED записей уровня INFO и ниже и ограничивает их частоту.
+
+    Предупреждения и ошибки проходят всегда.
+    """
+
+    def __init__(self, sample_rate: float = 1.0, rate_limit: float = 0.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.rate_limit = rate_limit
+        self._tokens = rate_limit
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        sampled = getattr(record, "sampled", False) or _record_extra(record).get("sampled", False)
+        if record.levelno > logging.INFO or not sampled:
+            return True
+
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return False
+
+        if self.rate_limit <= 0:
+            return True
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._updated) * self.rate_limit)
+            self._updated = now
+            if self._tokens < 1.0:
+                return False
+            self._tokens -= 1.0
+            return True
+
+
+class MarkSampledFilter(logging.Filter):
+    """Помечает записи логгера как поточные, чтобы к ним применялось сэмплирование."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.sampled = True
+        return True
+
+
+class DeferredFormatQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который не форматирует запись в вызывающем потоке.
+
+    Стандартный prepare() применяет форматтер, дописывает трассировку в
+    сообщение и очищает exc_info. Здесь подставляются только аргументы
+    сообщения, а трассировку форматирует обработчик в потоке QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        # loguru ставит exc_text = "\n" вместо трассировки — пусть ее отформатирует обработчик
+        if record.exc_info:
+            record.exc_text = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and key != "extra" and not key.startswith("_"):
+                data[key] = value
+        for key, value in _record_extra(record).items():
+            if key != "sampled":
+                data[key] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def _loguru_format(record) -> str:
+    return "{message}"
+
+
+def configure_logging(
+    level: str = "INFO",
+    json_format: bool = True,
+    log_file: Optional[str] = None,
+    max_bytes: int = 10 * 1024 * 1024,
+    backup_count: int = 10,
+    sample_rate: float = 1.0,
+    rate_limit: float = 0.0
+):
+    """Настраивает неблокирующий конвейер логирования.
+
+    Записи stdlib logging, loguru и uvicorn попадают в одну очередь. В
+    вызывающем потоке подставляются только аргументы сообщения; JSON,
+    трассировки исключений и запись в файл делает фоновый поток QueueListener.
+    """
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+
+    formatter = JsonFormatter() if json_format else logging.Formatter(
+        "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+    )
+
+    handlers = []
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(formatter)
+    handlers.append(stream_handler)
+
+    if log_file:
+        # Ротация RotatingFileHandler небезопасна, если файл открыт в нескольких процессах
+        log_file = log_file.format(hostname=socket.gethostname(), pid=os.getpid())
+        try:
+            Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+            )
+            file_handler.setFormatter(formatter)
+            handlers.append(file_handler)
+        except OSError as e:
+            print(f"Файл логов недоступен ({log_file}): {e}", file=sys.stderr)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredFormatQueueHandler(log_queue)
+    # Фильтры работают в вызывающем потоке: отброшенные записи не попадают в очередь
+    queue_handler.addFilter(SamplingFilter(sample_rate, rate_limit))
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    # uvicorn настраивает свои логгеры до создания приложения — переводим их на общую очередь
+    for name in _UVICORN_LOGGERS:
+        uvicorn_logger = logging.getLogger(name)
+        for handler in list(uvicorn_logger.handlers):
+            uvicorn_logger.removeHandler(handler)
+        uvicorn_logger.propagate = True
+    access_logger = logging.getLogger("uvicorn.access")
+    for existing in list(access_logger.filters):
+        if isinstance(existing, MarkSampledFilter):
+            access_logger.removeFilter(existing)
+    access_logger.addFilter(MarkSampledFilter())
+
+    loguru_logger.remove()
+    # Строковый формат loguru дописывает {exception} к сообщению в вызывающем потоке;
+    # формат-функция этого не делает, и трассировку форматирует обработчик по exc_info
+    loguru_logger.add(queue_handler, level=level, format=_loguru_format)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,4 +1,3 @@
-import logging
 import asyncio
 from loguru import logger
 import sys
@@ -7,36 +6,31 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.config import settings
+from app.logging_config import configure_logging, shutdown_logging
 from app.core.embedder import Embedder
-from app.clients.qdrant_client import QdrantClientWrapper
+from app.clients.qdrant_client import QdrantClientWrapper, get_collection_profile
 from app.clients.chatwoot_client import ChatwootClient
 from app.core.knowledge_manager import KnowledgeBaseManager
 from app.core.assistant import SupportAssistant
+from app.core.preprocessor import QueryPreprocessor
+from app.core.job_queue import JobQueue
+from app.core.profiling import SamplingProfiler, RequestProfiler, EventLoopLagMonitor, SlowRequestLog
 from app.api.api import SupportAssistantAPI
 
 def setup_logging():
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    
-    logger.remove()
-    logger.add(
-        sys.stderr,
-        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-        level="INFO",
-        colorize=True
-    )
-
-    logger.add(
-        "/var/log/support-assistant/app.log",
-        rotation="10 MB",
-        retention="30 days",
-        compression="zip",
-        level="INFO"
+    configure_logging(
+        level=settings.log_level,
+        json_format=settings.log_json,
+        log_file=settings.log_file,
+        max_bytes=settings.log_file_max_bytes,
+        backup_count=settings.log_backup_count,
+        sample_rate=settings.log_sample_rate,
+        rate_limit=settings.log_rate_limit_per_second
     )
 
 async def create_app():
+    setup_logging()
+
     logger.info("Запуск инициализации Support Assistant...")
 
     try:
@@ -51,7 +45,8 @@ async def create_app():
         qdrant_client = QdrantClientWrapper(
             host=settings.qdrant_host,
             port=settings.qdrant_port,
-            collection_name="support_kb"
+            collection_name="support_kb",
+            profile=get_collection_profile(settings.qdrant_profile, settings.qdrant_profile_overrides)
         )
 
         logger.info("Инициализация Chatwoot клиента...")
@@ -71,13 +66,28 @@ async def create_app():
         kb_manager = KnowledgeBaseManager(
             qdrant_client=qdrant_client,
             embedder=embedder,
-            source_path=settings.knowledge_base_path
+            source_path=settings.knowledge_base_path,
+            snapshot_path=settings.kb_snapshot_path,
+            watch_interval=settings.kb_watch_interval_seconds,
+            watch_debounce=settings.kb_watch_debounce_seconds
         )
 
         logger.info("Загрузка базы знаний...")
         await kb_manager.initialize_knowledge_base()
         logger.info("База знаний успешно загружена")
 
+        # Коллекция не пересоздается при рестарте — приводим ее параметры к текущему профилю
+        try:
+            await asyncio.to_thread(qdrant_client.ensure_profile)
+        except Exception as e:
+            logger.error(f"Не удалось применить профиль коллекции Qdrant: {e}")
+
+
+        slow_request_log = SlowRequestLog(
+            path=os.path.join(settings.profile_dir, "slow_requests.jsonl"),
+            threshold_ms=settings.slow_request_threshold_ms,
+            max_bytes=settings.slow_request_log_max_bytes
+        )
 
         logger.info("Инициализация AI-ассистента...")
         assistant = SupportAssistant(
@@ -85,12 +95,42 @@ async def create_app():
             chatwoot_client=chatwoot_client,
             embedder=embedder,
             top_k=3,
-            private=True
+            private=True,
+            preprocessor=QueryPreprocessor(
+                truncate=embedder.truncate_text,
+                max_chars=settings.query_max_chars,
+                lowercase=settings.query_lowercase
+            ),
+            kb_manager=kb_manager,
+            fast_path_threshold=settings.kb_fast_path_threshold,
+            slow_request_log=slow_request_log
         )
 
+        logger.info("Инициализация очереди задач...")
+        job_queue = JobQueue(db_path=settings.queue_db_path)
+
         logger.info("Создание FastAPI приложения...")
-        api = SupportAssistantAPI(assistant=assistant, kb_manager=kb_manager)
+        api = SupportAssistantAPI(
+            assistant=assistant,
+            kb_manager=kb_manager,
+            job_queue=job_queue,
+            watch_kb=settings.kb_watch_enabled,
+            admin_token=settings.admin_token,
+            sampling_profiler=SamplingProfiler(max_seconds=settings.profile_max_seconds),
+            # В API профилировщик только отдает файлы: вебхук лишь ставит задачу в очередь,
+            # а cProfile запросов работает в воркерах
+            request_profiler=RequestProfiler(
+                output_dir=settings.profile_dir,
+                max_files=settings.profile_max_files
+            ),
+            loop_lag_monitor=EventLoopLagMonitor(
+                interval=settings.loop_lag_interval_seconds,
+                warn_ms=settings.loop_lag_warn_ms
+            ),
+            slow_request_log=slow_request_log
+        )
         app = api.get_app()
+        app.add_event_handler("shutdown", shutdown_logging)
 
         logger.info("Support Assistant успешно инициализирован!")
         logger.info(f"API будет доступно по адресу: http://{settings.api_host}:{settings.api_port}")
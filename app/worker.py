@@ -0,0 +1,253 @@
+import asyncio
+import os
+import signal
+import socket
+import sys
+import time
+
+from loguru import logger
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.core.embedder import Embedder
+from app.clients.qdrant_client import QdrantClientWrapper, get_collection_profile
+from app.clients.chatwoot_client import ChatwootClient
+from app.core.assistant import SupportAssistant
+from app.core.preprocessor import QueryPreprocessor
+from app.core.job_queue import JobQueue
+from app.core.knowledge_manager import KnowledgeBaseManager
+from app.core.profiling import SamplingProfiler, RequestProfiler, EventLoopLagMonitor, SlowRequestLog
+from app.main import setup_logging
+from app.logging_config import set_request_id, shutdown_logging
+
+
+class QueueWorker:
+    def __init__(
+        self,
+        assistant: SupportAssistant,
+        job_queue: JobQueue,
+        kb_manager: KnowledgeBaseManager = None,
+        request_profiler: RequestProfiler = None,
+        loop_lag_monitor: EventLoopLagMonitor = None,
+        sampling_profiler: SamplingProfiler = None,
+        worker_id: str = None
+    ):
+        self.assistant = assistant
+        self.job_queue = job_queue
+        self.kb_manager = kb_manager
+        self.request_profiler = request_profiler
+        self.loop_lag_monitor = loop_lag_monitor or EventLoopLagMonitor(warn_ms=None)
+        self.sampling_profiler = sampling_profiler or SamplingProfiler()
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self._last_profile_request = job_queue.last_profile_request_id()
+        self._last_status_report = 0.0
+        self._profile_tasks = set()
+        self._stopping = asyncio.Event()
+        self._sampled_logger = logger.bind(sampled=True)
+
+        logger.info(f"Воркер очереди инициализирован: {self.worker_id}")
+
+    def stop(self):
+        logger.info(f"Остановка воркера {self.worker_id}...")
+        self._stopping.set()
+
+    async def run_once(self) -> bool:
+        # Чтение снимка и построение индекса вопросов не должны блокировать цикл воркера
+        if self.kb_manager is not None and await asyncio.to_thread(self.kb_manager.refresh_snapshot):
+            logger.info("Снимок базы знаний обновлен")
+
+        job = await asyncio.to_thread(
+            self.job_queue.claim, self.worker_id, settings.queue_lease_seconds, settings.queue_max_attempts
+        )
+        if job is None:
+            return False
+
+        set_request_id(job.request_id or f"job-{job.id}")
+        self._sampled_logger.info(
+            "Задача {} взята в работу (беседа {}, попытка {})", job.id, job.conversation_id, job.attempts
+        )
+
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            if self.request_profiler is not None:
+                with self.request_profiler.profile(f"job-{job.id}"):
+                    success = await self.assistant.process_message(job.conversation_id, job.message)
+            else:
+                success = await self.assistant.process_message(job.conversation_id, job.message)
+        except Exception as e:
+            success = False
+            error = str(e)
+        else:
+            error = "process_message returned False"
+        finally:
+            heartbeat.cancel()
+
+        # Запись в SQLite может ждать блокировку до busy_timeout — не держим цикл воркера
+        if success:
+            await asyncio.to_thread(self.job_queue.complete, job)
+            self._sampled_logger.info("Задача {} выполнена", job.id)
+        else:
+            await asyncio.to_thread(
+                self.job_queue.fail,
+                job,
+                error,
+                settings.queue_max_attempts,
+                settings.queue_retry_delay_seconds
+            )
+
+        await asyncio.to_thread(self.job_queue.add_counters, self.assistant.fast_path_stats.drain())
+        return True
+
+    async def _maintenance(self):
+        now = time.monotonic()
+        if now - self._last_status_report >= settings.worker_status_interval_seconds:
+            self._last_status_report = now
+            await asyncio.to_thread(
+                self.job_queue.report_worker_status,
+                self.worker_id,
+                {"pid": os.getpid(), "loop_lag": self.loop_lag_monitor.stats()}
+            )
+
+        requests = await asyncio.to_thread(self.job_queue.profile_requests_after, self._last_profile_request)
+        for request in requests:
+            self._last_profile_request = request["id"]
+            task = asyncio.create_task(self._run_profile(request))
+            self._profile_tasks.add(task)
+            task.add_done_callback(self._profile_tasks.discard)
+
+    async def _run_profile(self, request):
+        if self.request_profiler is None:
+            logger.warning("Каталог профилей не настроен, запрос профилирования пропущен")
+            return
+
+        # Сэмплер работает в отдельном потоке, воркер продолжает обрабатывать задачи
+        try:
+            collapsed = await asyncio.to_thread(self.sampling_profiler.sample, request["seconds"], request["interval"])
+            path = await asyncio.to_thread(
+                self.request_profiler.save_collapsed, f"worker-{self.worker_id}-{request['id']}", collapsed
+            )
+            logger.info(f"Профиль воркера сохранен: {path}")
+        except Exception as e:
+            logger.error(f"Ошибка профилирования воркера: {e}")
+
+    async def _heartbeat(self, job):
+        # Продлеваем аренду, пока задача обрабатывается, чтобы ее не забрал другой воркер
+        interval = settings.queue_lease_seconds / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                extended = await asyncio.to_thread(self.job_queue.extend_lease, job, settings.queue_lease_seconds)
+            except Exception as e:
+                logger.error(f"Ошибка продления аренды задачи {job.id}: {e}")
+                continue
+            if not extended:
+                return
+
+    async def run(self):
+        logger.info(f"Воркер {self.worker_id} запущен")
+        self.loop_lag_monitor.start()
+
+        while not self._stopping.is_set():
+            try:
+                await self._maintenance()
+                processed = await self.run_once()
+            except Exception as e:
+                logger.error(f"Ошибка воркера очереди: {e}")
+                processed = False
+
+            if not processed:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=settings.queue_poll_interval_seconds)
+                except asyncio.TimeoutError:
+                    pass
+
+        await self.loop_lag_monitor.stop()
+        self.job_queue.close()
+        logger.info(f"Воркер {self.worker_id} остановлен")
+
+
+async def create_worker() -> QueueWorker:
+    logger.info("Запуск инициализации воркера очереди...")
+
+    embedder = Embedder(model_name=settings.embedder_model)
+
+    qdrant_client = QdrantClientWrapper(
+        host=settings.qdrant_host,
+        port=settings.qdrant_port,
+        collection_name="support_kb",
+        profile=get_collection_profile(settings.qdrant_profile, settings.qdrant_profile_overrides)
+    )
+
+    chatwoot_client = ChatwootClient(
+        base_url=settings.chatwoot_base_url,
+        api_token=settings.chatwoot_api_token,
+        account_id=settings.chatwoot_account_id
+    )
+
+    # Воркер только читает снимок БЗ, собранный API, для быстрого пути по вопросам
+    kb_manager = KnowledgeBaseManager(
+        qdrant_client=qdrant_client,
+        embedder=embedder,
+        source_path=settings.knowledge_base_path,
+        snapshot_path=settings.kb_snapshot_path
+    )
+    if not kb_manager.load_snapshot():
+        logger.warning("Снимок базы знаний не найден, быстрый путь выключен до его появления")
+
+    assistant = SupportAssistant(
+        qdrant_client=qdrant_client,
+        chatwoot_client=chatwoot_client,
+        embedder=embedder,
+        top_k=3,
+        private=True,
+        preprocessor=QueryPreprocessor(
+            truncate=embedder.truncate_text,
+            max_chars=settings.query_max_chars,
+            lowercase=settings.query_lowercase
+        ),
+        kb_manager=kb_manager,
+        fast_path_threshold=settings.kb_fast_path_threshold,
+        slow_request_log=SlowRequestLog(
+            path=os.path.join(settings.profile_dir, "slow_requests.jsonl"),
+            threshold_ms=settings.slow_request_threshold_ms,
+            max_bytes=settings.slow_request_log_max_bytes
+        )
+    )
+
+    job_queue = JobQueue(db_path=settings.queue_db_path)
+
+    return QueueWorker(
+        assistant=assistant,
+        job_queue=job_queue,
+        kb_manager=kb_manager,
+        request_profiler=RequestProfiler(
+            output_dir=settings.profile_dir,
+            sample_rate=settings.profile_request_sample_rate,
+            max_files=settings.profile_max_files
+        ),
+        # В воркере векторизация ожидаемо блокирует цикл — задержку только измеряем, без предупреждений
+        loop_lag_monitor=EventLoopLagMonitor(interval=settings.loop_lag_interval_seconds, warn_ms=None),
+        sampling_profiler=SamplingProfiler(max_seconds=settings.profile_max_seconds)
+    )
+
+
+async def main():
+    worker = await create_worker()
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+
+    await worker.run()
+    shutdown_logging()
+
+
+if __name__ == "__main__":
+    setup_logging()
+
+    try:
+        asyncio.run(main())
+    except Exception as e:
+        logger.error(f"Критическая ошибка воркера: {e}")
+        sys.exit(1)
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.clients.qdrant_client import QdrantClientWrapper, get_collection_profile, COLLECTION_PROFILES
+
+def main():
+    parser = argparse.ArgumentParser(description="Применение профиля к существующей коллекции Qdrant")
+    parser.add_argument("--profile", default=settings.qdrant_profile, choices=list(COLLECTION_PROFILES))
+    parser.add_argument("--collection", default="support_kb")
+    args = parser.parse_args()
+
+    try:
+        profile = get_collection_profile(args.profile, settings.qdrant_profile_overrides)
+        print(f"Профиль: {profile}")
+
+        qdrant_client = QdrantClientWrapper(
+            host=settings.qdrant_host,
+            port=settings.qdrant_port,
+            collection_name=args.collection,
+            profile=profile
+        )
+
+        if not qdrant_client.collection_exists():
+            print(f"Ошибка: коллекция '{args.collection}' не найдена")
+            sys.exit(1)
+
+        qdrant_client.apply_profile()
+        print("Профиль применен, Qdrant перестроит индекс в фоне без повторной векторизации")
+
+    except Exception as e:
+        print(f"Ошибка применения профиля: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
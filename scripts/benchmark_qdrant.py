@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+import argparse
+import time
+import sys
+import os
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.core.embedder import Embedder
+from app.clients.qdrant_client import QdrantClientWrapper, get_collection_profile, COLLECTION_PROFILES
+from app.core.knowledge_manager import KnowledgeBaseManager
+
+def wait_for_indexing(qdrant_client: QdrantClientWrapper, timeout: float = 300.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        info = qdrant_client.client.get_collection(qdrant_client.collection_name)
+        if str(info.status).lower().endswith("green"):
+            return
+        time.sleep(0.5)
+    print(f"Предупреждение: индексация '{qdrant_client.collection_name}' не завершилась за {timeout} с")
+
+def build_dataset(embedder: Embedder, synthetic: int, seed: int):
+    kb_manager = KnowledgeBaseManager(qdrant_client=None, embedder=embedder, source_path=settings.knowledge_base_path)
+    df = kb_manager.load_knowledge_base()
+    texts, payloads = kb_manager.prepare_data(df)
+
+    vectors = np.asarray(embedder.embed_texts(texts), dtype=np.float32)
+    queries = np.asarray(embedder.embed_texts([p["question"] for p in payloads]), dtype=np.float32)
+
+    if synthetic > 0:
+        # Шумные копии реальных векторов, чтобы коллекция была больше, а распределение — правдоподобным
+        rng = np.random.default_rng(seed)
+        base = vectors[rng.integers(0, len(vectors), synthetic)]
+        noise = rng.normal(0.0, 0.05, base.shape).astype(np.float32)
+        extra = base + noise
+        extra /= np.linalg.norm(extra, axis=1, keepdims=True)
+        vectors = np.vstack([vectors, extra])
+        payloads = payloads + [{"question": "", "answer": "", "category": "synthetic"} for _ in range(synthetic)]
+
+    return vectors, payloads, queries
+
+def run_profile(name: str, vectors, payloads, queries, top_k: int, batch_size: int):
+    qdrant_client = QdrantClientWrapper(
+        host=settings.qdrant_host,
+        port=settings.qdrant_port,
+        collection_name=f"support_kb_bench_{name}",
+        profile=get_collection_profile(name)
+    )
+
+    try:
+        qdrant_client.create_collection(vectors.shape[1])
+        for start in range(0, len(vectors), batch_size):
+            qdrant_client.add_points(
+                vectors[start:start + batch_size].tolist(),
+                payloads[start:start + batch_size]
+            )
+        wait_for_indexing(qdrant_client)
+
+        latencies = []
+        hits = 0
+        for query in queries:
+            query = query.tolist()
+            exact = {r["id"] for r in qdrant_client.search(query, top_k, exact=True)}
+
+            started = time.perf_counter()
+            approx = qdrant_client.search(query, top_k)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+            hits += len(exact & {r["id"] for r in approx})
+
+        latencies = np.asarray(latencies)
+        return {
+            "profile": name,
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "recall": hits / (len(queries) * top_k)
+        }
+    finally:
+        qdrant_client.delete_collection()
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение профилей коллекции Qdrant: задержка и recall@k относительно точного поиска")
+    parser.add_argument("--profiles", nargs="+", default=list(COLLECTION_PROFILES), choices=list(COLLECTION_PROFILES))
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--synthetic", type=int, default=0, help="Количество дополнительных синтетических точек; HNSW строится только после "
+                             "порога индексации Qdrant (~13 тыс. векторов размерности 384)")
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print("Подготовка данных...")
+    embedder = Embedder(model_name=settings.embedder_model)
+    vectors, payloads, queries = build_dataset(embedder, args.synthetic, args.seed)
+    print(f"Точек: {len(vectors)}, запросов: {len(queries)}, top_k: {args.top_k}")
+
+    results = []
+    for name in args.profiles:
+        print(f"Профиль '{name}'...")
+        results.append(run_profile(name, vectors, payloads, queries, args.top_k, args.batch_size))
+
+    print()
+    print(f"{'profile':<14}{'p50, мс':>10}{'p95, мс':>10}{f'recall@{args.top_k}':>12}")
+    for result in results:
+        print(f"{result['profile']:<14}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['recall']:>12.3f}")
+
+if __name__ == "__main__":
+    main()
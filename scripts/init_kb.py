@@ -8,7 +8,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.config import settings
 from app.core.embedder import Embedder
-from app.clients.qdrant_client import QdrantClientWrapper
+from app.clients.qdrant_client import QdrantClientWrapper, get_collection_profile
 from app.core.knowledge_manager import KnowledgeBaseManager
 
 async def main():
@@ -21,14 +21,16 @@ async def main():
         print("Инициализация Qdrant клиента...")
         qdrant_client = QdrantClientWrapper(
             host=settings.qdrant_host,
-            port=settings.qdrant_port
+            port=settings.qdrant_port,
+            profile=get_collection_profile(settings.qdrant_profile, settings.qdrant_profile_overrides)
         )
 
         print("Инициализация менеджера базы знаний...")
         kb_manager = KnowledgeBaseManager(
             qdrant_client=qdrant_client,
             embedder=embedder,
-            source_path=settings.knowledge_base_path
+            source_path=settings.knowledge_base_path,
+            snapshot_path=settings.kb_snapshot_path
         )
 
         print("Загрузка базы знаний AI-брокера...")
@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+from app.core.job_queue import JobQueue
+
+
+@pytest.fixture
+def job_queue(tmp_path):
+    queue = JobQueue(db_path=str(tmp_path / "jobs.db"))
+    yield queue
+    queue.close()
+
+
+def test_claim_complete(job_queue):
+    job_id = job_queue.enqueue(1, "Как открыть ИИС?", request_id="req-1")
+
+    job = job_queue.claim("w1", lease_seconds=30)
+
+    assert job.id == job_id
+    assert job.attempts == 1
+    assert job.request_id == "req-1"
+    assert job_queue.claim("w2", lease_seconds=30) is None
+    assert job_queue.complete(job)
+    assert job_queue.stats()["done"] == 1
+
+
+def test_expired_lease_is_reclaimed_and_old_owner_loses_it(job_queue):
+    job_queue.enqueue(1, "вопрос")
+    first = job_queue.claim("w1", lease_seconds=0.01)
+    time.sleep(0.02)
+
+    second = job_queue.claim("w2", lease_seconds=30)
+
+    assert second.id == first.id
+    assert second.attempts == 2
+    assert not job_queue.complete(first)
+    assert not job_queue.extend_lease(first)
+    assert job_queue.complete(second)
+
+
+def test_extend_lease_prevents_reclaim(job_queue):
+    job_queue.enqueue(1, "вопрос")
+    job = job_queue.claim("w1", lease_seconds=0.05)
+
+    assert job_queue.extend_lease(job, lease_seconds=30)
+    time.sleep(0.06)
+
+    assert job_queue.claim("w2", lease_seconds=30) is None
+
+
+def test_fail_retries_then_marks_failed(job_queue):
+    job_queue.enqueue(1, "вопрос")
+
+    job = job_queue.claim("w1")
+    assert job_queue.fail(job, "boom", max_attempts=2, retry_delay=0)
+    assert job_queue.stats()["pending"] == 1
+
+    job = job_queue.claim("w1")
+    assert job_queue.fail(job, "boom", max_attempts=2, retry_delay=0)
+    assert job_queue.stats()["failed"] == 1
+    assert job_queue.claim("w1") is None
+
+
+def test_expired_lease_after_max_attempts_is_failed(job_queue):
+    job_queue.enqueue(1, "сообщение, роняющее воркер")
+
+    for attempt in range(1, 4):
+        job = job_queue.claim("w1", lease_seconds=0.01, max_attempts=3)
+        assert job.attempts == attempt
+        time.sleep(0.02)
+
+    assert job_queue.claim("w1", lease_seconds=0.01, max_attempts=3) is None
+    assert job_queue.stats()["failed"] == 1
+
+
+def test_idle_claim_does_not_take_write_lock(job_queue, tmp_path):
+    other = JobQueue(db_path=str(tmp_path / "jobs.db"))
+    try:
+        other._conn.execute("BEGIN IMMEDIATE")
+        # Без ожидания блокировки: попытка взять блокировку записи сразу завершится ошибкой
+        job_queue._conn.execute("PRAGMA busy_timeout=0")
+
+        assert job_queue.claim("w1") is None
+
+        other._conn.execute("COMMIT")
+    finally:
+        other.close()
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from app.core.kb_snapshot import KnowledgeBaseSnapshot, _ALIGNMENT, _HEADER, read_snapshot, write_snapshot
+
+
+def make_rows(count):
+    return [
+        {
+            "question": f"Вопрос {i}",
+            "answer": f"Ответ {i}",
+            "category": "invest" if i % 2 else "general",
+            "content_hash": f"hash-{i}",
+            "index": i
+        }
+        for i in range(count)
+    ]
+
+
+def make_snapshot(rows, vectors):
+    return KnowledgeBaseSnapshot(
+        rows=rows,
+        vectors=vectors,
+        source_path="data/knowledge_base.csv",
+        source_hash="abc123",
+        model_name="BAAI/bge-small-ru"
+    )
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_round_trip(tmp_path, mmap):
+    path = tmp_path / "kb.snapshot"
+    vectors = np.random.default_rng(0).random((5, 8), dtype=np.float32)
+    snapshot = make_snapshot(make_rows(5), vectors)
+
+    write_snapshot(path, snapshot)
+    loaded = read_snapshot(path, mmap=mmap)
+
+    assert isinstance(loaded.vectors, np.memmap) == mmap
+    assert loaded.vectors.dtype == np.float32
+    np.testing.assert_array_equal(loaded.vectors, vectors)
+    assert loaded.rows == snapshot.rows
+    assert loaded.categories == {"general": 3, "invest": 2}
+    assert loaded.source_hash == "abc123"
+    assert loaded.model_name == "BAAI/bge-small-ru"
+    assert loaded.created_at == snapshot.created_at
+    np.testing.assert_array_equal(loaded.vectors_by_hash()["hash-3"], vectors[3])
+    assert not (tmp_path / "kb.snapshot.tmp").exists()
+
+
+def test_vectors_are_aligned(tmp_path):
+    path = tmp_path / "kb.snapshot"
+    vectors = np.arange(12, dtype=np.float32).reshape(3, 4)
+    write_snapshot(path, make_snapshot(make_rows(3), vectors))
+
+    loaded = read_snapshot(path)
+
+    assert loaded.vectors.offset % _ALIGNMENT == 0
+    assert loaded.vectors.offset >= _HEADER.size
+    assert path.stat().st_size == loaded.vectors.offset + vectors.nbytes
+
+
+@pytest.mark.parametrize("vectors", [np.zeros((0, 8), dtype=np.float32), np.zeros((0,), dtype=np.float32)])
+def test_empty_knowledge_base(tmp_path, vectors):
+    path = tmp_path / "kb.snapshot"
+    write_snapshot(path, make_snapshot([], vectors))
+
+    loaded = read_snapshot(path)
+
+    assert loaded.rows == []
+    assert loaded.vectors.shape[0] == 0
+    assert loaded.categories == {}
+
+
+def test_rejects_foreign_file(tmp_path):
+    path = tmp_path / "kb.snapshot"
+    path.write_bytes(b"question,answer\n" * 4)
+
+    with pytest.raises(ValueError):
+        read_snapshot(path)
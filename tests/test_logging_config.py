@@ -0,0 +1,65 @@
+import io
+import json
+import logging
+
+import pytest
+from loguru import logger as loguru_logger
+
+from app import logging_config
+
+
+def capture(json_format):
+    logging_config.configure_logging(json_format=json_format)
+    stream = io.StringIO()
+    logging_config._listener.handlers[0].stream = stream
+    return stream
+
+
+@pytest.fixture(autouse=True)
+def shutdown():
+    yield
+    logging_config.shutdown_logging()
+
+
+def raise_and_log(log):
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        log()
+
+
+@pytest.mark.parametrize("log", [
+    lambda: logging.getLogger("test").exception("ошибка %s", 1),
+    lambda: loguru_logger.exception("ошибка {}", 1),
+])
+def test_json_traceback_is_formatted_once(log):
+    stream = capture(json_format=True)
+
+    raise_and_log(log)
+    logging_config.shutdown_logging()
+
+    data = json.loads(stream.getvalue())
+    assert data["message"] == "ошибка 1"
+    assert "ZeroDivisionError" in data["exc_info"]
+
+
+def test_text_traceback_from_loguru():
+    stream = capture(json_format=False)
+
+    raise_and_log(lambda: loguru_logger.exception("ошибка"))
+    logging_config.shutdown_logging()
+
+    output = stream.getvalue()
+    assert output.count("ZeroDivisionError: division by zero") == 1
+    assert "Traceback" in output
+
+
+def test_log_file_is_per_process(tmp_path):
+    logging_config.configure_logging(log_file=str(tmp_path / "app-{hostname}-{pid}.log"))
+    logging.getLogger("test").warning("запись")
+    logging_config.shutdown_logging()
+
+    files = list(tmp_path.iterdir())
+    assert len(files) == 1
+    assert "{" not in files[0].name
+    assert "запись" in files[0].read_text(encoding="utf-8")
@@ -0,0 +1,106 @@
+import pytest
+
+from app.core.preprocessor import QueryPreprocessor
+
+
+@pytest.fixture
+def preprocessor():
+    return QueryPreprocessor(max_chars=200)
+
+
+def test_strips_html(preprocessor):
+    result = preprocessor.preprocess(
+        "<div><p>Как <b>открыть</b> ИИС?</p><script>alert(1)</script><br>Срочно&nbsp;нужно</div>"
+    )
+
+    assert result.cleaned == "Как открыть ИИС? Срочно нужно"
+    assert not result.trivial
+
+
+def test_strips_blockquote(preprocessor):
+    result = preprocessor.preprocess(
+        "<p>Не пришли дивиденды</p><blockquote>Ранее: как купить облигации?</blockquote>"
+    )
+
+    assert result.cleaned == "Не пришли дивиденды"
+
+
+def test_strips_quoted_reply(preprocessor):
+    result = preprocessor.preprocess(
+        "Не пришли дивиденды\n\nПн, 1 апр. 2024 г. в 10:00, Поддержка пишет:\n> Здравствуйте!\n> Чем помочь?"
+    )
+
+    assert result.cleaned == "Не пришли дивиденды"
+
+
+def test_strips_email_header_block(preprocessor):
+    result = preprocessor.preprocess(
+        "Как вывести деньги?\n\nFrom: support@example.com\nSent: Monday\nSubject: Re: вывод\n\nСтарое письмо"
+    )
+
+    assert result.cleaned == "Как вывести деньги?"
+
+
+def test_keeps_question_after_quote_like_line(preprocessor):
+    result = preprocessor.preprocess("Иван пишет:\nКак открыть ИИС?")
+
+    assert result.cleaned == "Иван пишет: Как открыть ИИС?"
+    assert not result.trivial
+
+
+@pytest.mark.parametrize("text", [
+    "Как открыть ИИС?\n\nС уважением,\nИван Петров\n+7 999 123-45-67",
+    "Как открыть ИИС?\n--\nИван Петров\nООО Ромашка",
+    "Как открыть ИИС?\n\nSent from my iPhone",
+    "Как открыть ИИС?\n\nОтправлено из мобильной Почты",
+    "Как открыть ИИС?\n\nС уважением,\nИван\n\nFrom: a@example.com\nSent: Monday\nTo: b@example.com\n\nСтарое письмо",
+])
+def test_strips_signature(preprocessor, text):
+    assert preprocessor.preprocess(text).cleaned == "Как открыть ИИС?"
+
+
+def test_keeps_signature_like_line_followed_by_text(preprocessor):
+    text = "Как открыть ИИС?\n--\n" + "\n".join(f"Подробности проблемы, строка {i}" for i in range(10))
+
+    assert preprocessor.preprocess(text).cleaned.startswith("Как открыть ИИС? -- Подробности")
+
+
+@pytest.mark.parametrize("text", ["Спасибо!", "  Добрый день  ", "Ок", "🙂", "", None, "Спасибо!\n\nС уважением,\nИван"])
+def test_trivial_messages(preprocessor, text):
+    assert preprocessor.preprocess(text).trivial
+
+
+@pytest.mark.parametrize("text", ["да", "нет", "Добрый день! Как открыть ИИС?"])
+def test_non_trivial_messages(preprocessor, text):
+    assert not preprocessor.preprocess(text).trivial
+
+
+def test_quote_only_message_falls_back_to_quote(preprocessor):
+    result = preprocessor.preprocess("> Как открыть ИИС?\n> Срочно")
+
+    assert result.cleaned == "> Как открыть ИИС? > Срочно"
+    assert result.normalized == "как открыть иис срочно"
+
+
+def test_truncates_by_characters(preprocessor):
+    result = preprocessor.preprocess("слово " * 1000)
+
+    assert result.truncated
+    assert len(result.text) == 200
+
+
+def test_truncates_by_tokens():
+    preprocessor = QueryPreprocessor(truncate=lambda text: " ".join(text.split()[:3]), max_chars=2000)
+
+    result = preprocessor.preprocess("как открыть ИИС в приложении")
+
+    assert result.text == "как открыть ИИС"
+    assert result.truncated
+    assert result.cleaned == "как открыть ИИС в приложении"
+
+
+def test_short_message_is_not_truncated(preprocessor):
+    result = preprocessor.preprocess("Как открыть ИИС?")
+
+    assert not result.truncated
+    assert result.text == "Как открыть ИИС?"
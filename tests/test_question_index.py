@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+from app.core.preprocessor import QueryPreprocessor
+from app.core.question_index import QuestionIndex, MATCH_EXACT, MATCH_NEAR, changes_negation, char_ngrams
+
+ROWS = [
+    {"question": "Как купить облигации и какие самые надежные?", "answer": "ОФЗ", "category": "bonds"},
+    {"question": "Как работает ИИС и какие есть типы?", "answer": "Тип А и Б", "category": "iis"},
+]
+
+
+def normalize(text):
+    return QueryPreprocessor.normalize(text)
+
+
+def test_exact_match_ignores_case_and_punctuation():
+    index = QuestionIndex(ROWS)
+
+    match = index.match(normalize("как работает ИИС, и какие есть типы??"))
+
+    assert match is not None
+    row, score, kind = match
+    assert row is ROWS[1]
+    assert score == 1.0
+    assert kind == MATCH_EXACT
+
+
+def test_near_match_above_threshold():
+    index = QuestionIndex(ROWS)
+
+    match = index.match(normalize("Как работает ИИС и какие есть типы счетов?"), threshold=0.8)
+
+    assert match is not None
+    row, score, kind = match
+    assert row is ROWS[1]
+    assert kind == MATCH_NEAR
+    assert 0.8 <= score < 1.0
+
+
+def test_unrelated_question_does_not_match():
+    index = QuestionIndex(ROWS)
+
+    assert index.match(normalize("Что такое маржинальная торговля?"), threshold=0.5) is None
+
+
+def test_negated_question_is_rejected_even_with_low_threshold():
+    index = QuestionIndex(ROWS)
+
+    assert index.match(normalize("Как купить облигации и какие самые ненадежные?"), threshold=0.8) is None
+    assert index.match(normalize("Как купить облигации и какие самые надежные?"), threshold=0.8)[2] == MATCH_EXACT
+
+
+def test_default_threshold_rejects_negation_by_score():
+    index = QuestionIndex(ROWS)
+
+    assert index.match(normalize("Как купить облигации и какие самые ненадежные?")) is None
+
+
+def test_changes_negation():
+    assert changes_negation("какие надежные облигации", "какие ненадежные облигации")
+    assert changes_negation("облигации без купона", "облигации с купоном")
+    assert changes_negation("не работает ИИС", "работает ИИС")
+    assert not changes_negation("какие есть типы счетов", "какие есть типы")
+
+
+@pytest.mark.parametrize("threshold", [0.8, 0.9, 0.95])
+def test_near_match_agrees_with_brute_force(threshold):
+    rng = random.Random(7)
+    words = ["счет", "карта", "вывод", "налог", "вычет", "иис", "акции", "тариф", "отчет", "пароль"]
+    rows = [{"question": " ".join(rng.choice(words) for _ in range(rng.randint(3, 6)))} for _ in range(300)]
+    index = QuestionIndex(rows)
+    keys = [QueryPreprocessor.normalize(row["question"]) for row in rows]
+
+    for _ in range(100):
+        query = QueryPreprocessor.normalize(rng.choice(keys) + rng.choice(["", "ы", " иис"]))
+        grams = char_ngrams(query)
+        expected = max(
+            (len(grams & char_ngrams(key)) / len(grams | char_ngrams(key)) for key in keys),
+            default=0.0
+        )
+
+        result = index.match(query, threshold)
+
+        if expected >= threshold and query not in keys:
+            assert result is not None and result[1] == pytest.approx(expected)
+        elif expected < threshold:
+            assert result is None